@@ -4,24 +4,32 @@ Complexity Scorer - Analyzes query complexity to determine model routing
 
 from __future__ import annotations
 
+import functools
+import re
+
 
 class ComplexityScorer:
     """Score query complexity on multiple dimensions"""
 
     # Keywords indicating complex reasoning
-    COMPLEX_KEYWORDS = {
+    COMPLEX_KEYWORDS = frozenset({
         "explain", "analyze", "compare", "strategy", "design", "architecture",
         "how would", "why", "implement", "optimize", "debug", "solve",
         "summarize", "create", "write", "compose", "essay", "code",
         "algorithm", "pattern", "structure", "system"
-    }
+    })
 
     # Keywords indicating simple queries
-    SIMPLE_KEYWORDS = {
+    SIMPLE_KEYWORDS = frozenset({
         "what is", "who is", "when", "where", "how many", "how much",
         "convert", "calculate", "define", "list", "what are",
         "capital", "president", "temperature", "distance"
-    }
+    })
+
+    # Patterns scored by score_patterns (code x3, analysis x2, creative x3)
+    CODE_PATTERNS = ("function", "method", "class", "loop", "array", "variable")
+    ANALYSIS_PATTERNS = ("trend", "pattern", "relationship", "correlation")
+    CREATIVE_PATTERNS = ("story", "poem", "essay", "creative", "imagine")
 
     @staticmethod
     def score_length(query: str) -> int:
@@ -38,20 +46,36 @@ class ComplexityScorer:
             return 5
 
     @staticmethod
-    def score_keywords(query: str) -> int:
-        """Score based on keyword presence"""
-        query_lower = query.lower()
+    def _match_counts(query: str) -> dict:
+        """
+        Count distinct phrase matches per category in one pass over the query
 
-        complex_matches = sum(1 for k in ComplexityScorer.COMPLEX_KEYWORDS
-                             if k in query_lower)
-        simple_matches = sum(1 for k in ComplexityScorer.SIMPLE_KEYWORDS
-                             if k in query_lower)
+        Returns:
+            {"complex": int, "simple": int, "code": int, "analysis": int, "creative": int}
+        """
+        counts = dict.fromkeys(_CATEGORIES, 0)
+        # A phrase counts once no matter how often it occurs, like `phrase in query`
+        for phrase in {m.group(1) for m in _PHRASE_RE.finditer(query.lower())}:
+            for category in _PHRASE_CATEGORIES[phrase]:
+                counts[category] += 1
+        return counts
 
+    @staticmethod
+    def _keyword_score(counts: dict) -> int:
         # Complex keywords are weighted higher
-        keyword_score = (complex_matches * 3) - (simple_matches * 2)
+        keyword_score = (counts["complex"] * 3) - (counts["simple"] * 2)
         # Prevent large negative values (which would reduce total below 0)
         return max(keyword_score, 0)
 
+    @staticmethod
+    def _pattern_score(counts: dict) -> int:
+        return counts["code"] * 3 + counts["analysis"] * 2 + counts["creative"] * 3
+
+    @classmethod
+    def score_keywords(cls, query: str) -> int:
+        """Score based on keyword presence"""
+        return cls._keyword_score(cls._match_counts(query))
+
     @staticmethod
     def score_punctuation(query: str) -> int:
         """Score based on punctuation patterns"""
@@ -61,8 +85,10 @@ class ComplexityScorer:
         if "?" in query:
             score += 1
 
-        # Multiple sentences suggest complexity
-        if query.count(".") > 1:
+        # Multiple sentences suggest complexity. Stop at the second "."
+        # instead of counting every one across the whole query.
+        first_dot = query.find(".")
+        if first_dot != -1 and query.find(".", first_dot + 1) != -1:
             score += 2
 
         # Exclamations might indicate emphasis
@@ -75,25 +101,10 @@ class ComplexityScorer:
 
         return score
 
-    @staticmethod
-    def score_patterns(query: str) -> int:
-        """Score based on common patterns"""
-        query_lower = query.lower()
-        score = 0
-
-        # Code-related patterns
-        code_patterns = ["function", "method", "class", "loop", "array", "variable"]
-        score += sum(1 for p in code_patterns if p in query_lower) * 3
-
-        # Analysis patterns
-        analysis_patterns = ["trend", "pattern", "relationship", "correlation"]
-        score += sum(1 for p in analysis_patterns if p in query_lower) * 2
-
-        # Creative patterns
-        creative_patterns = ["story", "poem", "essay", "creative", "imagine"]
-        score += sum(1 for p in creative_patterns if p in query_lower) * 3
-
-        return score
+    @classmethod
+    def score_patterns(cls, query: str) -> int:
+        """Score based on common patterns (code, analysis, creative)"""
+        return cls._pattern_score(cls._match_counts(query))
 
     @classmethod
     def compute_score(cls, query: str) -> dict:
@@ -109,10 +120,7 @@ class ComplexityScorer:
                 "pattern_score": int
             }
         """
-        length_score = cls.score_length(query)
-        keyword_score = cls.score_keywords(query)
-        punctuation_score = cls.score_punctuation(query)
-        pattern_score = cls.score_patterns(query)
+        length_score, keyword_score, punctuation_score, pattern_score = _component_scores(query)
 
         total_score = length_score + keyword_score + punctuation_score + pattern_score
 
@@ -138,8 +146,17 @@ class ComplexityScorer:
         SLM (TinyLlama) for: < threshold
         LLM (Mixtral) for: >= threshold
         """
-        score_data = cls.compute_score(query)
-        return score_data["total_score"] >= threshold
+        # Length and punctuation are cheap; decide from them alone when the
+        # keyword/pattern scan (0 to _MAX_PHRASE_SCORE points) can't change
+        # the outcome
+        partial_score = cls.score_length(query) + cls.score_punctuation(query)
+        if partial_score >= threshold:
+            return True
+        if partial_score + _MAX_PHRASE_SCORE < threshold:
+            return False
+
+        # Components are non-negative, so their sum is the total score
+        return sum(_component_scores(query)) >= threshold
 
     @staticmethod
     def get_routing_reason(score: int, threshold: int = 12) -> str:
@@ -154,3 +171,52 @@ class ComplexityScorer:
         if score >= int(threshold / 2):
             return f"Moderate complexity (score={score}) — SLM may work but LLM preferred for quality."
         return f"Simple (score={score}) — use SLM (fast, local)."
+
+
+@functools.lru_cache(maxsize=4096)
+def _component_scores(query: str) -> tuple[int, int, int, int]:
+    """
+    (length, keyword, punctuation, pattern) scores for a query, memoized
+
+    Scoring is pure over the query text, so repeated queries skip the scan.
+    A tuple is cached (not the result dict) so callers can't mutate it.
+    """
+    # Keywords and patterns share a single scan of the query
+    counts = ComplexityScorer._match_counts(query)
+    return (
+        ComplexityScorer.score_length(query),
+        ComplexityScorer._keyword_score(counts),
+        ComplexityScorer.score_punctuation(query),
+        ComplexityScorer._pattern_score(counts),
+    )
+
+
+# Every scored phrase mapped to the categories it belongs to ("pattern" and
+# "essay" are both keywords and patterns), matched together by one regex.
+# Built once at import; the phrase collections above are immutable so the
+# compiled matcher can't drift out of sync with them.
+_CATEGORIES = ("complex", "simple", "code", "analysis", "creative")
+_PHRASE_CATEGORIES: dict[str, tuple[str, ...]] = {}
+for _category, _phrases in zip(_CATEGORIES, (
+    ComplexityScorer.COMPLEX_KEYWORDS,
+    ComplexityScorer.SIMPLE_KEYWORDS,
+    ComplexityScorer.CODE_PATTERNS,
+    ComplexityScorer.ANALYSIS_PATTERNS,
+    ComplexityScorer.CREATIVE_PATTERNS,
+)):
+    for _phrase in _phrases:
+        _PHRASE_CATEGORIES[_phrase] = _PHRASE_CATEGORIES.get(_phrase, ()) + (_category,)
+
+# Zero-width lookahead so overlapping phrases ("codesign" -> "code", "design")
+# are all reported, as the per-phrase substring checks did.
+_PHRASE_RE = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_PHRASE_CATEGORIES, key=len, reverse=True))) + "))"
+)
+
+# Upper bound on keyword + pattern points (every weighted phrase present)
+_MAX_PHRASE_SCORE = (
+    3 * len(ComplexityScorer.COMPLEX_KEYWORDS)
+    + 3 * len(ComplexityScorer.CODE_PATTERNS)
+    + 2 * len(ComplexityScorer.ANALYSIS_PATTERNS)
+    + 3 * len(ComplexityScorer.CREATIVE_PATTERNS)
+)
@@ -1,6 +1,21 @@
 from __future__ import annotations
 
-# These constants are DEPRECATED - use estimate_emissions() in router.py instead
+# Carbon and water per 1000 tokens (normalized). The single source for
+# ModelOrchestrator, MetricsLogger and router.estimate_emissions.
+LLM_CARBON_PER_1K_TOKENS = 0.15   # grams
+LLM_WATER_PER_1K_TOKENS = 2.5     # ml
+SLM_CARBON_PER_1K_TOKENS = 0.005  # grams
+SLM_WATER_PER_1K_TOKENS = 0.08    # ml
+
+# Footprint per token, folded once at import
+CARBON_LLM_PER_TOK = LLM_CARBON_PER_1K_TOKENS / 1000  # grams CO2
+CARBON_SLM_PER_TOK = SLM_CARBON_PER_1K_TOKENS / 1000  # grams CO2
+WATER_LLM_PER_TOK = LLM_WATER_PER_1K_TOKENS / 1000    # ml
+WATER_SLM_PER_TOK = SLM_WATER_PER_1K_TOKENS / 1000    # ml
+CARBON_SAVED_PER_TOK = CARBON_LLM_PER_TOK - CARBON_SLM_PER_TOK
+WATER_SAVED_PER_TOK = WATER_LLM_PER_TOK - WATER_SLM_PER_TOK
+
+# The per-call constants below are DEPRECATED - use estimate_emissions() in router.py instead
 # Keeping for reference only
 
 LLM_CARBON_G = 0.3
@@ -8,6 +23,11 @@ LLM_WATER_ML = 5.0
 SLM_CARBON_G = 0.01
 SLM_WATER_ML = 0.1
 
+# Per-call savings of an SLM call over an LLM call, folded once at import;
+# multiply by a call count at the call site instead of calling calculate_savings
+CARBON_DELTA_G = LLM_CARBON_G - SLM_CARBON_G
+WATER_DELTA_ML = LLM_WATER_ML - SLM_WATER_ML
+
 
 def calculate_savings(slm_calls: int) -> dict[str, float]:
     """
@@ -16,6 +36,4 @@ def calculate_savings(slm_calls: int) -> dict[str, float]:
     
     Legacy function kept for backward compatibility.
     """
-    carbon_saved = (LLM_CARBON_G - SLM_CARBON_G) * slm_calls
-    water_saved = (LLM_WATER_ML - SLM_WATER_ML) * slm_calls
-    return {"carbon_saved_g": carbon_saved, "water_saved_ml": water_saved}
\ No newline at end of file
+    return {"carbon_saved_g": CARBON_DELTA_G * slm_calls, "water_saved_ml": WATER_DELTA_ML * slm_calls}
\ No newline at end of file
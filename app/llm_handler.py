@@ -4,11 +4,19 @@ Powerful, open-source, free reasoning engine
 """
 
 from __future__ import annotations
+import asyncio
+import logging
 import os
-from typing import Optional
+from typing import AsyncIterator, Optional
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 
+logger = logging.getLogger(__name__)
+
 
 class LLMHandler:
     """
@@ -36,10 +44,32 @@ class LLMHandler:
         self.model_config = self.MODEL_CONFIG
         self._initialized = False
         self._model_loading = False
+        self._session = self._create_session()
+        self._async_client: Optional[httpx.AsyncClient] = None
         
         if self.hf_api_key:
             self.initialize()
     
+    def _create_session(self) -> requests.Session:
+        """
+        Keep-alive session for the Inference API
+
+        Reusing pooled connections skips the DNS lookup and TCP+TLS
+        handshake that a bare requests.post() pays on every call.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.2)
+        )
+        session.mount("https://", adapter)
+        # Bodies are pre-encoded with orjson and sent as raw bytes
+        session.headers["Content-Type"] = "application/json"
+        if self.hf_api_key:
+            session.headers["Authorization"] = f"Bearer {self.hf_api_key}"
+        return session
+    
     def initialize(self) -> bool:
         """
         Initialize HuggingFace API connection to Mixtral
@@ -51,38 +81,90 @@ class LLMHandler:
             return True
         
         if not self.hf_api_key:
-            print("⚠️  HuggingFace API key not found.")
-            print("   Get free API key at: https://huggingface.co/settings/tokens")
+            logger.warning(
+                "⚠️  HuggingFace API key not found. "
+                "Get free API key at: https://huggingface.co/settings/tokens"
+            )
             return False
         
         try:
-            headers = {"Authorization": f"Bearer {self.hf_api_key}"}
-            
-            print(f"📥 Connecting to {self.model_config['name']}")
-            print("   (Model will load on first query, ~30-60 seconds)")
+            logger.info(
+                "📥 Connecting to %s (model will load on first query, ~30-60 seconds)",
+                self.model_config["name"]
+            )
             
             # Just verify the API key works
-            response = requests.post(
+            response = self._session.post(
                 self.model_config["api_url"],
-                headers=headers,
                 json={"inputs": "test", "options": {"wait_for_model": False}},
                 timeout=5
             )
             
             self._initialized = True
-            print("✅ LLM (Mixtral 8x7B) initialized")
+            logger.info("✅ LLM (Mixtral 8x7B) initialized")
             return True
         
         except requests.exceptions.Timeout:
             self._initialized = True  # Still mark as initialized
-            print("✅ LLM (Mixtral 8x7B) connection ready")
+            logger.info("✅ LLM (Mixtral 8x7B) connection ready")
             return True
         except Exception as e:
-            print(f"⚠️  Connection check failed: {e}")
-            print("   Will try again on first query...")
+            logger.warning("⚠️  Connection check failed: %s. Will try again on first query...", e)
             self._initialized = True
             return True
     
+    # Static parts of every generation request, built once
+    _INST_PREFIX = "[INST] "
+    _INST_SUFFIX = " [/INST]"
+    _SAMPLING_PARAMS = {
+        "top_p": 0.95,
+        "top_k": 50,
+        "repetition_penalty": 1.1,
+        "do_sample": True
+    }
+    _OPTIONS = {
+        "wait_for_model": True  # Wait if model is loading
+    }
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: Optional[float],
+        stream: bool = False
+    ) -> bytes:
+        """Encode the Inference API request body for a prompt (JSON bytes)"""
+        if temperature is None:
+            temperature = self.model_config["temperature"]
+        
+        # Format as chat instruction
+        body = {
+            "inputs": self._INST_PREFIX + prompt + self._INST_SUFFIX,
+            "parameters": {
+                "max_new_tokens": max_tokens,
+                "temperature": temperature,
+                **self._SAMPLING_PARAMS
+            },
+            "options": self._OPTIONS
+        }
+        if stream:
+            body["stream"] = True
+        return orjson.dumps(body)
+    
+    @staticmethod
+    def _extract_text(result) -> str:
+        """Pull the generated answer out of an Inference API response"""
+        # Handle response format
+        if isinstance(result, list) and len(result) > 0:
+            if "generated_text" in result[0]:
+                text = result[0]["generated_text"]
+                # Remove the prompt from the output
+                if "[/INST]" in text:
+                    text = text.split("[/INST]")[-1].strip()
+                return text
+        
+        return str(result)
+    
     def generate_response(
         self,
         prompt: str,
@@ -104,69 +186,136 @@ class LLMHandler:
             if not self.initialize():
                 return "Error: LLM not initialized. Set HF_API_KEY environment variable."
         
-        if temperature is None:
-            temperature = self.model_config["temperature"]
-        
         try:
-            headers = {"Authorization": f"Bearer {self.hf_api_key}"}
+            payload = self._build_payload(prompt, max_tokens, temperature)
             
-            # Format as chat instruction
-            formatted_prompt = f"""[INST] {prompt} [/INST]"""
-            
-            payload = {
-                "inputs": formatted_prompt,
-                "parameters": {
-                    "max_new_tokens": max_tokens,
-                    "temperature": temperature,
-                    "top_p": 0.95,
-                    "top_k": 50,
-                    "repetition_penalty": 1.1,
-                    "do_sample": True
-                },
-                "options": {
-                    "wait_for_model": True  # Wait if model is loading
-                }
-            }
-            
-            print("🔄 Calling Mixtral 8x7B...")
+            logger.debug("🔄 Calling Mixtral 8x7B...")
             start_time = time.time()
             
-            response = requests.post(
+            response = self._session.post(
                 self.model_config["api_url"],
-                headers=headers,
-                json=payload,
+                data=payload,
                 timeout=120  # Longer timeout for inference
             )
             
             elapsed = time.time() - start_time
-            print(f"✅ Response received ({elapsed:.1f}s)")
+            logger.debug("✅ Response received (%.1fs)", elapsed)
             
             response.raise_for_status()
-            result = response.json()
+            return self._extract_text(response.json())
+        
+        except requests.exceptions.Timeout:
+            return "⏱️ Model is loading or overloaded. Please try again in a moment."
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Lazily create the shared async client (inside the running event loop)"""
+        if self._async_client is None:
+            headers = {"Content-Type": "application/json"}
+            if self.hf_api_key:
+                headers["Authorization"] = f"Bearer {self.hf_api_key}"
+            self._async_client = httpx.AsyncClient(
+                http2=True,
+                timeout=120,  # Longer timeout for inference
+                headers=headers,
+                limits=httpx.Limits(max_keepalive_connections=4)
+            )
+        return self._async_client
+    
+    async def agenerate_response(
+        self,
+        prompt: str,
+        max_tokens: int = 500,
+        temperature: float = None
+    ) -> str:
+        """
+        Async variant of generate_response used by the API request path
+        
+        Awaiting the HTTP call on the event loop means a slow Mixtral
+        response no longer pins a worker thread for its whole duration.
+        """
+        if not self._initialized:
+            if not await asyncio.to_thread(self.initialize):
+                return "Error: LLM not initialized. Set HF_API_KEY environment variable."
+        
+        try:
+            payload = self._build_payload(prompt, max_tokens, temperature)
             
-            # Handle response format
-            if isinstance(result, list) and len(result) > 0:
-                if "generated_text" in result[0]:
-                    text = result[0]["generated_text"]
-                    # Remove the prompt from the output
-                    if "[/INST]" in text:
-                        text = text.split("[/INST]")[-1].strip()
-                    return text
+            logger.debug("🔄 Calling Mixtral 8x7B...")
+            start_time = time.time()
             
-            return str(result)
+            response = await self._get_async_client().post(
+                self.model_config["api_url"],
+                content=payload
+            )
+            
+            elapsed = time.time() - start_time
+            logger.debug("✅ Response received (%.1fs)", elapsed)
+            
+            response.raise_for_status()
+            return self._extract_text(response.json())
         
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             return "⏱️ Model is loading or overloaded. Please try again in a moment."
         except Exception as e:
             return f"Error: {str(e)}"
     
+    async def astream_response(
+        self,
+        prompt: str,
+        max_tokens: int = 500,
+        temperature: float = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a Mixtral response token by token (server-sent events)
+        
+        Args:
+            prompt: User query/prompt
+            max_tokens: Maximum tokens in response
+            temperature: Creativity level (0-2)
+        
+        Yields:
+            Successive pieces of the response text
+        """
+        if not self._initialized:
+            if not await asyncio.to_thread(self.initialize):
+                yield "Error: LLM not initialized. Set HF_API_KEY environment variable."
+                return
+        
+        try:
+            payload = self._build_payload(prompt, max_tokens, temperature, stream=True)
+            
+            logger.debug("🔄 Streaming from Mixtral 8x7B...")
+            async with self._get_async_client().stream(
+                "POST", self.model_config["api_url"], content=payload
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    token = orjson.loads(line[5:]).get("token") or {}
+                    if not token.get("special"):
+                        yield token.get("text", "")
+        
+        except httpx.TimeoutException:
+            yield "⏱️ Model is loading or overloaded. Please try again in a moment."
+        except Exception as e:
+            yield f"Error: {str(e)}"
+    
+    async def aclose(self) -> None:
+        """Close the async client's pooled connections"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+    
     def count_tokens(self, text: str) -> int:
         """
         Estimate token count for Mixtral
         
-        Approximation: ~4 characters per token
+        Approximation: ~4 characters per token (integer shift, no float division)
         """
-        return int(len(text) / 4)
+        return len(text) >> 2
     
     def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
         """
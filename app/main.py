@@ -1,15 +1,48 @@
 from __future__ import annotations
 
-from fastapi import FastAPI
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from app.model_orchestrator import ModelOrchestrator
 import os
 import asyncio
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
+import orjson
 
 # Load environment variables from .env if present (safe local development)
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def _configure_logging() -> QueueListener:
+    """
+    Send app.* log records through a queue to a stderr handler
+
+    Request handlers only enqueue records; formatting and the stream
+    write happen on the listener's background thread.
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    app_logger = logging.getLogger("app")
+    app_logger.addHandler(QueueHandler(log_queue))
+    app_logger.setLevel(logging.INFO)
+    app_logger.propagate = False
+
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+
+# Configured before the orchestrator is built so its init logging is captured
+_log_listener = _configure_logging()
+
 app = FastAPI(
     title="GreenRoute AI",
     description="""
@@ -25,7 +58,9 @@ app = FastAPI(
     - Metrics Tracking: Monitors latency, cost, carbon impact
     - Environmental Monitoring: Tracks carbon & water savings
     """,
-    version="2.0.0"
+    version="2.0.0",
+    # Render response bodies with orjson (C) instead of stdlib json
+    default_response_class=ORJSONResponse
 )
 
 # Initialize orchestrator with open-source models
@@ -37,19 +72,28 @@ orchestrator = ModelOrchestrator(
 
 @app.on_event("startup")
 async def startup_prewarm_models():
-    """Pre-warm local SLM and remote LLM on startup in background threads.
+    """Pre-warm the remote LLM on startup in the background.
 
-    This avoids cold-start latency during the first user request. Runs
-    initialization in threads so the FastAPI event loop is not blocked.
+    This avoids cold-start latency during the first user request. The local
+    SLM is already loading on the orchestrator's preload thread, started
+    when the orchestrator was created.
     """
     async def _prewarm():
-        slm_ok = await asyncio.to_thread(orchestrator.slm.initialize)
         llm_ok = await asyncio.to_thread(orchestrator.llm.initialize)
-        print(f"🔁 Startup pre-warm complete: SLM initialized={slm_ok}, LLM initialized={llm_ok}")
+        logger.info("🔁 Startup pre-warm complete: LLM initialized=%s", llm_ok)
 
     # Schedule pre-warm asynchronously and don't await to keep startup fast
     asyncio.create_task(_prewarm())
 
+
+@app.on_event("shutdown")
+async def shutdown_close_clients():
+    """Stop SLM batching and close pooled HTTP connections held by the model handlers."""
+    await orchestrator.slm_batcher.aclose()
+    await orchestrator.slm.aclose()
+    await orchestrator.llm.aclose()
+    _log_listener.stop()
+
 class QueryRequest(BaseModel):
     query: str
     mode: str = "AUTO"
@@ -60,7 +104,7 @@ class QueryResponse(BaseModel):
     response: str
     model_used: str
     mode: str
-    complexity_score: int
+    complexity_score: Optional[int]  # None when the user forced a model
     routing_reason: str
     latency_ms: float
     tokens: dict
@@ -87,23 +131,14 @@ def health_check():
     }
 
 
-@app.post("/query", response_model=QueryResponse)
-async def process_query(payload: QueryRequest) -> QueryResponse:
+def _to_query_response(result: dict) -> QueryResponse:
     """
-    Process a query with automatic model selection
-    
-    The orchestrator automatically:
-    1. Analyzes query complexity
-    2. Decides between SLM and LLM
-    3. Generates response
-    4. Calculates environmental impact
-    5. Logs metrics
+    Map an orchestrator result dict onto the API response model
+
+    Built with model_construct: FastAPI already validates the returned
+    value against response_model, so validating here too doubles the work.
     """
-    # Run the blocking orchestration in a separate thread to avoid
-    # blocking the FastAPI event loop (SLM/LLM calls are synchronous).
-    result = await asyncio.to_thread(orchestrator.process_query, payload.query, payload.mode)
-    
-    return QueryResponse(
+    return QueryResponse.model_construct(
         query=result["query"],
         response=result["response"],
         model_used=result["model_used"],
@@ -114,12 +149,80 @@ async def process_query(payload: QueryRequest) -> QueryResponse:
         tokens=result["tokens"],
         cost_usd=result["cost_usd"],
         carbon_saved_g=result["carbon_saved_g"],
-        water_saved_ml=result["water_saved_ml"]
-        ,emissions_carbon_g=result["emissions_carbon_g"],
+        water_saved_ml=result["water_saved_ml"],
+        emissions_carbon_g=result["emissions_carbon_g"],
         emissions_water_ml=result["emissions_water_ml"]
     )
 
 
+@app.post("/query", response_model=QueryResponse)
+async def process_query(payload: QueryRequest) -> QueryResponse:
+    """
+    Process a query with automatic model selection
+    
+    The orchestrator automatically:
+    1. Analyzes query complexity
+    2. Decides between SLM and LLM
+    3. Generates response
+    4. Calculates environmental impact
+    5. Logs metrics
+    """
+    # LLM calls are awaited natively; only local SLM inference is handed
+    # to a worker thread inside the orchestrator.
+    result = await orchestrator.process_query(payload.query, payload.mode)
+    
+    return _to_query_response(result)
+
+
+# Limits for /query/batch, so one request can't fan out unbounded model calls
+MAX_BATCH_SIZE = 32
+MAX_BATCH_CONCURRENCY = 4
+
+
+@app.post("/query/batch", response_model=List[QueryResponse])
+async def process_query_batch(payload: List[QueryRequest]) -> List[QueryResponse]:
+    """
+    Process several queries in one request
+    
+    Queries are routed independently but run concurrently (up to
+    MAX_BATCH_CONCURRENCY at a time), so Mixtral calls overlap on the event
+    loop and one HTTP round trip covers the batch. Responses are returned in
+    request order; batches over MAX_BATCH_SIZE are rejected with 413.
+    """
+    if len(payload) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: at most {MAX_BATCH_SIZE} queries per request"
+        )
+    
+    # At most MAX_BATCH_CONCURRENCY queries of this batch run at once
+    slots = asyncio.Semaphore(MAX_BATCH_CONCURRENCY)
+    
+    async def run(item: QueryRequest) -> dict:
+        async with slots:
+            return await orchestrator.process_query(item.query, item.mode)
+    
+    results = await asyncio.gather(*(run(item) for item in payload))
+    
+    return [_to_query_response(result) for result in results]
+
+
+@app.post("/query/stream")
+async def process_query_stream(payload: QueryRequest) -> StreamingResponse:
+    """
+    Process a query and stream the answer as it is generated
+    
+    The body is newline-delimited JSON events: "start" (routing decision),
+    one "token" per text chunk, then "done" with the same fields as /query
+    plus time_to_first_token_ms.
+    """
+    async def events():
+        async for event in orchestrator.process_query_stream(payload.query, payload.mode):
+            yield orjson.dumps(event) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.get("/stats", response_model=StatsResponse)
 async def get_statistics() -> StatsResponse:
     """Get system statistics and metrics"""
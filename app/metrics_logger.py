@@ -3,22 +3,57 @@ Metrics Logger - Tracks system performance and costs
 """
 
 from __future__ import annotations
+from collections import deque
 from datetime import datetime
+from itertools import islice
 from typing import Optional
-import json
+import time
+
+import orjson
+
+from app.impact import (
+    CARBON_LLM_PER_TOK,
+    CARBON_SLM_PER_TOK,
+    WATER_LLM_PER_TOK,
+    WATER_SLM_PER_TOK,
+)
+
+# Models tracked individually by get_model_comparison
+COMPARED_MODELS = ("TinyLlama", "Mixtral")
 
 
 class MetricsLogger:
     """Logs and tracks metrics for monitoring and analysis"""
     
-    def __init__(self):
-        """Initialize metrics logger"""
-        self.metrics = []
+    def __init__(self, max_entries: int = 10_000):
+        """
+        Initialize metrics logger
+        
+        Args:
+            max_entries: Most recent entries kept for /stats and export;
+                older ones are dropped (summary totals still count them)
+        """
+        self.metrics = deque(maxlen=max_entries)
+
+        # Running totals updated by log_query, so summaries are O(1)
+        # no matter how many queries have been logged
+        self._totals = {
+            "queries": 0,
+            "cost": 0.0,
+            "latency": 0.0,
+            "tokens": 0,
+            "carbon_saved": 0.0,
+            "water_saved": 0.0
+        }
+        self._per_model = {
+            model: {"count": 0, "latency": 0.0, "cost": 0.0, "tokens": 0, "output_tokens": 0}
+            for model in COMPARED_MODELS
+        }
     
     def log_query(
         self,
         query: str,
-        complexity_score: int,
+        complexity_score: Optional[int],
         model_used: str,
         latency: float,
         input_tokens: int,
@@ -26,14 +61,15 @@ class MetricsLogger:
         cost: float,
         response: str,
         carbon_saved: float = 0.0,
-        water_saved: float = 0.0
+        water_saved: float = 0.0,
+        time_to_first_token: Optional[float] = None
     ) -> dict:
         """
         Log a query execution
         
         Args:
             query: Original query
-            complexity_score: Computed complexity score
+            complexity_score: Computed complexity score (None for forced modes)
             model_used: "TinyLlama" or "Mixtral"
             latency: Response time in seconds
             input_tokens: Tokens in input
@@ -42,12 +78,15 @@ class MetricsLogger:
             response: Generated response
             carbon_saved: CO2 saved in grams
             water_saved: Water saved in ml
+            time_to_first_token: Seconds until the first streamed chunk
+                (None when the response wasn't streamed)
         
         Returns:
-            Metric entry as dictionary
+            Metric entry as dictionary (timestamp as epoch nanoseconds;
+            formatted to ISO 8601 only when entries are read back)
         """
         metric = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": time.time_ns(),
             "query": query,
             "complexity_score": complexity_score,
             "model_used": model_used,
@@ -60,9 +99,30 @@ class MetricsLogger:
             "carbon_saved_g": round(carbon_saved, 4),
             "water_saved_ml": round(water_saved, 2)
         }
+        if time_to_first_token is not None:
+            metric["ttft_ms"] = round(time_to_first_token * 1000, 2)
         
         self.metrics.append(metric)
+        self._add_to_totals(metric)
         return metric
+
+    def _add_to_totals(self, metric: dict) -> None:
+        """Fold a metric entry into the running totals"""
+        totals = self._totals
+        totals["queries"] += 1
+        totals["cost"] += metric["cost_usd"]
+        totals["latency"] += metric["latency_ms"]
+        totals["tokens"] += metric["total_tokens"]
+        totals["carbon_saved"] += metric["carbon_saved_g"]
+        totals["water_saved"] += metric["water_saved_ml"]
+
+        model_totals = self._per_model.get(metric["model_used"])
+        if model_totals is not None:
+            model_totals["count"] += 1
+            model_totals["latency"] += metric["latency_ms"]
+            model_totals["cost"] += metric["cost_usd"]
+            model_totals["tokens"] += metric["total_tokens"]
+            model_totals["output_tokens"] += metric["output_tokens"]
     
     def get_summary(self) -> dict:
         """
@@ -71,7 +131,7 @@ class MetricsLogger:
         Returns:
             Summary dictionary with aggregated metrics
         """
-        if not self.metrics:
+        if not self._totals["queries"]:
             return {
                 "total_queries": 0,
                 "tinyllama_queries": 0,
@@ -81,30 +141,43 @@ class MetricsLogger:
                 "avg_latency": 0.0,
                 "total_tokens": 0,
                 "total_carbon_saved": 0.0,
-                "total_water_saved": 0.0
+                "total_water_saved": 0.0,
+                "total_emissions_carbon_g": 0.0,
+                "total_emissions_water_ml": 0.0
             }
         
-        tinyllama_count = sum(1 for m in self.metrics if m["model_used"] == "TinyLlama")
-        mixtral_count = sum(1 for m in self.metrics if m["model_used"] == "Mixtral")
-        total_cost = sum(m["cost_usd"] for m in self.metrics)
-        total_latency = sum(m["latency_ms"] for m in self.metrics)
-        total_tokens = sum(m["total_tokens"] for m in self.metrics)
-        total_carbon_saved = sum(m["carbon_saved_g"] for m in self.metrics)
-        total_water_saved = sum(m["water_saved_ml"] for m in self.metrics)
+        totals = self._totals
+        total_queries = totals["queries"]
+        tinyllama_count = self._per_model["TinyLlama"]["count"]
+        mixtral_count = self._per_model["Mixtral"]["count"]
+        total_cost = totals["cost"]
+        total_latency = totals["latency"]
+        total_tokens = totals["tokens"]
+        total_carbon_saved = totals["carbon_saved"]
+        total_water_saved = totals["water_saved"]
+        
+        # Emissions scale with output tokens, so the per-model token totals
+        # give the footprint of every logged query in two multiply-adds
+        mixtral_output = self._per_model["Mixtral"]["output_tokens"]
+        tinyllama_output = self._per_model["TinyLlama"]["output_tokens"]
+        total_emissions_carbon = mixtral_output * CARBON_LLM_PER_TOK + tinyllama_output * CARBON_SLM_PER_TOK
+        total_emissions_water = mixtral_output * WATER_LLM_PER_TOK + tinyllama_output * WATER_SLM_PER_TOK
         
         return {
-            "total_queries": len(self.metrics),
+            "total_queries": total_queries,
             "tinyllama_queries": tinyllama_count,
             "mixtral_queries": mixtral_count,
-            "tinyllama_percentage": round((tinyllama_count / len(self.metrics) * 100), 1) if self.metrics else 0,
+            "tinyllama_percentage": round((tinyllama_count / total_queries * 100), 1),
             "total_cost_usd": round(total_cost, 4),
             "total_latency_ms": round(total_latency, 2),
-            "avg_latency_ms": round(total_latency / len(self.metrics), 2) if self.metrics else 0,
+            "avg_latency_ms": round(total_latency / total_queries, 2),
             "total_tokens": total_tokens,
-            "avg_tokens_per_query": round(total_tokens / len(self.metrics), 1) if self.metrics else 0,
+            "avg_tokens_per_query": round(total_tokens / total_queries, 1),
             "total_carbon_saved_g": round(total_carbon_saved, 4),
             "total_water_saved_ml": round(total_water_saved, 2),
-            "cost_per_query": round(total_cost / len(self.metrics), 6) if self.metrics else 0
+            "total_emissions_carbon_g": round(total_emissions_carbon, 4),
+            "total_emissions_water_ml": round(total_emissions_water, 2),
+            "cost_per_query": round(total_cost / total_queries, 6)
         }
     
     def get_model_comparison(self) -> dict:
@@ -114,11 +187,8 @@ class MetricsLogger:
         Returns:
             Comparison dictionary
         """
-        tinyllama_metrics = [m for m in self.metrics if m["model_used"] == "TinyLlama"]
-        mixtral_metrics = [m for m in self.metrics if m["model_used"] == "Mixtral"]
-        
-        tinyllama_summary = self._summarize_metrics(tinyllama_metrics)
-        mixtral_summary = self._summarize_metrics(mixtral_metrics)
+        tinyllama_summary = self._summarize_metrics(self._per_model["TinyLlama"])
+        mixtral_summary = self._summarize_metrics(self._per_model["Mixtral"])
         
         return {
             "tinyllama": tinyllama_summary,
@@ -128,9 +198,10 @@ class MetricsLogger:
         }
     
     @staticmethod
-    def _summarize_metrics(metrics: list) -> dict:
-        """Summarize a list of metrics"""
-        if not metrics:
+    def _summarize_metrics(model_totals: dict) -> dict:
+        """Summarize one model's running totals"""
+        count = model_totals["count"]
+        if not count:
             return {
                 "count": 0,
                 "avg_latency": 0,
@@ -139,16 +210,23 @@ class MetricsLogger:
             }
         
         return {
-            "count": len(metrics),
-            "avg_latency": round(sum(m["latency_ms"] for m in metrics) / len(metrics), 2),
-            "avg_cost": round(sum(m["cost_usd"] for m in metrics) / len(metrics), 6),
-            "avg_tokens": round(sum(m["total_tokens"] for m in metrics) / len(metrics), 1),
-            "total_cost": round(sum(m["cost_usd"] for m in metrics), 4)
+            "count": count,
+            "avg_latency": round(model_totals["latency"] / count, 2),
+            "avg_cost": round(model_totals["cost"] / count, 6),
+            "avg_tokens": round(model_totals["tokens"] / count, 1),
+            "total_cost": round(model_totals["cost"], 4)
         }
     
     def get_recent_metrics(self, limit: int = 10) -> list:
         """Get recent metrics"""
-        return self.metrics[-limit:]
+        # islice rejects negative counts; treat them as "none"
+        recent = list(islice(reversed(self.metrics), max(limit, 0)))
+        return [self._format_entry(m) for m in reversed(recent)]
+
+    @staticmethod
+    def _format_entry(metric: dict) -> dict:
+        """Copy of a metric entry with its timestamp rendered as ISO 8601"""
+        return {**metric, "timestamp": datetime.fromtimestamp(metric["timestamp"] / 1e9).isoformat()}
     
     def export_metrics(self, filepath: str) -> bool:
         """
@@ -161,12 +239,12 @@ class MetricsLogger:
             True if successful
         """
         try:
-            with open(filepath, 'w') as f:
-                json.dump({
-                    "metrics": self.metrics,
+            with open(filepath, 'wb') as f:
+                f.write(orjson.dumps({
+                    "metrics": [self._format_entry(m) for m in self.metrics],
                     "summary": self.get_summary(),
                     "comparison": self.get_model_comparison()
-                }, f, indent=2)
+                }, option=orjson.OPT_INDENT_2))
             return True
         except Exception as e:
             print(f"Error exporting metrics: {e}")
@@ -4,11 +4,23 @@ Executes the routed model and RETURNS THE ANSWER
 """
 
 from __future__ import annotations
+import asyncio
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
 from app.complexity_scorer import ComplexityScorer
-from app.slm_handler import SLMHandler
+from app.slm_handler import SLMHandler, BatchingSLM
 from app.llm_handler import LLMHandler
 from app.metrics_logger import MetricsLogger
+from app.impact import (
+    CARBON_LLM_PER_TOK,
+    CARBON_SLM_PER_TOK,
+    WATER_LLM_PER_TOK,
+    WATER_SLM_PER_TOK,
+    CARBON_SAVED_PER_TOK,
+    WATER_SAVED_PER_TOK,
+)
 
 
 class ModelOrchestrator:
@@ -21,63 +33,137 @@ class ModelOrchestrator:
     - LLM  : force Mixtral
     """
 
-    def __init__(self, complexity_threshold: int = 12, hf_api_key: str = None):
+    def __init__(self, complexity_threshold: int = 12, hf_api_key: str = None, preload_slm: bool = True):
         self.complexity_threshold = complexity_threshold
 
-        self.slm = SLMHandler()          # TinyLlama (local)
+        self.slm = SLMHandler()          # TinyLlama (local, or SLM_SERVER_URL)
+        if preload_slm:
+            # Load TinyLlama in the background from process start, so the
+            # first query doesn't pay the 30-60s cold start
+            threading.Thread(target=self.slm.preload, name="slm-preload", daemon=True).start()
+        self.slm_batcher = BatchingSLM(self.slm)  # batches concurrent SLM calls
+        # Token counting off the event loop, overlapped with SLM generation
+        self._tok_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="count-tokens")
         self.llm = LLMHandler(hf_api_key=hf_api_key)  # Mixtral (HF)
 
         self.metrics = MetricsLogger()
 
-    def process_query(self, query: str, mode: str = "AUTO") -> dict:
+    async def process_query(self, query: str, mode: str = "AUTO") -> dict:
         start_time = time.time()
 
-        # 1️⃣ Complexity scoring
+        # 1️⃣ Complexity scoring + routing
+        route = self._route(query, mode)
+
+        # 2️⃣ EXECUTION (this is the critical part)
+        if route["model_used"] == "Mixtral":
+            response, tokens, cost = await self._process_with_llm(query)
+        else:
+            response, tokens, cost = await self._process_with_slm(query)
+
+        # 3️⃣ + 4️⃣ Log metrics, build the final response
+        return self._finish(query, route, response, tokens, cost, start_time)
+
+    async def process_query_stream(self, query: str, mode: str = "AUTO") -> AsyncIterator[dict]:
+        """
+        Streamed variant of process_query
+
+        Yields a "start" event with the routing decision, a "token" event
+        per generated text chunk, and a "done" event carrying the same
+        result dict as process_query plus time_to_first_token_ms.
+        """
+        start_time = time.time()
+        route = self._route(query, mode)
+        yield {
+            "event": "start",
+            "query": query,
+            "model_used": route["model_used"],
+            "mode": route["routing_mode"],
+            "routing_reason": route["routing_reason"],
+            "complexity_score": route["complexity_score"]
+        }
+
+        chunks = []
+        first_token_time = None
+        async for chunk in self._stream_text(query, route["model_used"]):
+            # Streamers can emit empty pieces; they aren't a first token
+            if not chunk:
+                continue
+            if first_token_time is None:
+                first_token_time = time.time()
+            chunks.append(chunk)
+            yield {"event": "token", "text": chunk}
+
+        response = "".join(chunks).strip()
+        # Off the event loop: an SLM count may have to (re)load the tokenizer
+        tokens, cost = await asyncio.get_running_loop().run_in_executor(
+            self._tok_executor, self._token_usage, route["model_used"], query, response
+        )
+        result = self._finish(query, route, response, tokens, cost, start_time, first_token_time)
+        yield {"event": "done", **result}
+
+    def _route(self, query: str, mode: str) -> dict:
+        """Pick the model for a query; scoring only happens in AUTO mode"""
+        if mode == "LLM":
+            return {
+                "model_used": "Mixtral",
+                "routing_reason": "User forced LLM",
+                "routing_mode": "User Override",
+                "complexity_score": None,
+                "complexity_breakdown": None
+            }
+
+        if mode == "SLM":
+            return {
+                "model_used": "TinyLlama",
+                "routing_reason": "User forced SLM",
+                "routing_mode": "User Override",
+                "complexity_score": None,
+                "complexity_breakdown": None
+            }
+
+        # AUTO
         complexity_data = ComplexityScorer.compute_score(query)
         complexity_score = complexity_data["total_score"]
+        return {
+            "model_used": "Mixtral" if complexity_score >= self.complexity_threshold else "TinyLlama",
+            "routing_reason": ComplexityScorer.get_routing_reason(complexity_score),
+            "routing_mode": "Automatic",
+            "complexity_score": complexity_score,
+            "complexity_breakdown": complexity_data["components"]
+        }
 
-        # 2️⃣ Routing + EXECUTION (this is the critical part)
-        if mode == "LLM":
-            response, tokens, cost = self._process_with_llm(query)
-            model_used = "Mixtral"
-            routing_reason = "User forced LLM"
-            routing_mode = "User Override"
-            carbon_saved = 0.0
-            water_saved = 0.0
+    def _finish(
+        self,
+        query: str,
+        route: dict,
+        response: str,
+        tokens: dict,
+        cost: float,
+        start_time: float,
+        first_token_time: Optional[float] = None
+    ) -> dict:
+        """Log a completed query and build its result dict"""
+        model_used = route["model_used"]
 
-        elif mode == "SLM":
-            response, tokens, cost = self._process_with_slm(query)
-            model_used = "TinyLlama"
-            routing_reason = "User forced SLM"
-            routing_mode = "User Override"
+        # Savings only when the SLM answered instead of the LLM
+        if model_used == "TinyLlama":
             carbon_saved = self._calculate_carbon_saved(tokens["output"])
             water_saved = self._calculate_water_saved(tokens["output"])
-
-        else:  # AUTO
-            if complexity_score >= self.complexity_threshold:
-                response, tokens, cost = self._process_with_llm(query)
-                model_used = "Mixtral"
-                carbon_saved = 0.0
-                water_saved = 0.0
-            else:
-                response, tokens, cost = self._process_with_slm(query)
-                model_used = "TinyLlama"
-                carbon_saved = self._calculate_carbon_saved(tokens["output"])
-                water_saved = self._calculate_water_saved(tokens["output"])
-
-            routing_reason = ComplexityScorer.get_routing_reason(complexity_score)
-            routing_mode = "Automatic"
+        else:
+            carbon_saved = 0.0
+            water_saved = 0.0
 
         # 🛡️ Fail-safe: never return empty answer
         if not response or not response.strip():
             response = "⚠️ Model executed but returned an empty response."
 
         latency = time.time() - start_time
+        time_to_first_token = None if first_token_time is None else first_token_time - start_time
 
         # 3️⃣ Log metrics
         self.metrics.log_query(
             query=query,
-            complexity_score=complexity_score,
+            complexity_score=route["complexity_score"],
             model_used=model_used,
             latency=latency,
             input_tokens=tokens["input"],
@@ -85,18 +171,19 @@ class ModelOrchestrator:
             cost=cost,
             response=response,
             carbon_saved=carbon_saved,
-            water_saved=water_saved
+            water_saved=water_saved,
+            time_to_first_token=time_to_first_token
         )
 
         # 4️⃣ Final response (API + UI SAFE)
-        return {
+        result = {
             "query": query,
             "response": response,  # ✅ THIS IS THE ANSWER
             "model_used": model_used,
-            "mode": routing_mode,
-            "routing_reason": routing_reason,
-            "complexity_score": complexity_score,
-            "complexity_breakdown": complexity_data["components"],
+            "mode": route["routing_mode"],
+            "routing_reason": route["routing_reason"],
+            "complexity_score": route["complexity_score"],
+            "complexity_breakdown": route["complexity_breakdown"],
             "latency_ms": round(latency * 1000, 2),
             "tokens": tokens,
             "cost_usd": round(cost, 6),
@@ -109,39 +196,73 @@ class ModelOrchestrator:
                 self._calculate_emissions_water(tokens["output"], model_used), 2
             )
         }
+        if time_to_first_token is not None:
+            result["time_to_first_token_ms"] = round(time_to_first_token * 1000, 2)
+        return result
 
     # ---------------- INTERNAL EXECUTION ---------------- #
 
-    def _process_with_slm(self, query: str) -> tuple:
-        response = self.slm.generate_response(query, max_tokens=150)
-        input_tokens = self.slm.count_tokens(query)
-        output_tokens = self.slm.count_tokens(response)
-        return response, {"input": input_tokens, "output": output_tokens}, 0.0
+    async def _process_with_slm(self, query: str) -> tuple:
+        loop = asyncio.get_running_loop()
+        # The input count doesn't depend on the answer; run it while the model decodes
+        input_count = loop.run_in_executor(self._tok_executor, self.slm.count_tokens, query)
+
+        if self.slm.remote:
+            # The SLM server batches continuously; send each query straight away
+            response = await self.slm.agenerate_response(query, max_tokens=150)
+        else:
+            # Concurrent queries share one batched generate() in a worker thread
+            response = await self.slm_batcher.submit(query, max_tokens=150)
+
+        output_tokens = await loop.run_in_executor(self._tok_executor, self.slm.count_tokens, response)
+        return response, {"input": await input_count, "output": output_tokens}, 0.0
+
+    async def _process_with_llm(self, query: str) -> tuple:
+        # Network-bound, so it is awaited on the event loop instead
+        response = await self.llm.agenerate_response(query, max_tokens=500)
+        return (response, *self._token_usage("Mixtral", query, response))
+
+    async def _stream_text(self, query: str, model_used: str) -> AsyncIterator[str]:
+        """Response text chunks from the chosen model as they are generated"""
+        if model_used == "Mixtral":
+            async for chunk in self.llm.astream_response(query, max_tokens=500):
+                yield chunk
+            return
+
+        # Local decoding is blocking; pull each chunk from a worker thread
+        chunks = self.slm.generate_stream(query, max_tokens=150)
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            yield chunk
 
-    def _process_with_llm(self, query: str) -> tuple:
-        response = self.llm.generate_response(query, max_tokens=500)
-        input_tokens = self.llm.count_tokens(query)
-        output_tokens = self.llm.count_tokens(response)
-        cost = self.llm.estimate_cost(input_tokens, output_tokens)
-        return response, {"input": input_tokens, "output": output_tokens}, cost
+    def _token_usage(self, model_used: str, query: str, response: str) -> tuple:
+        """({"input", "output"} token counts, cost in USD) for a finished response"""
+        if model_used == "Mixtral":
+            input_tokens = self.llm.count_tokens(query)
+            output_tokens = self.llm.count_tokens(response)
+            cost = self.llm.estimate_cost(input_tokens, output_tokens)
+        else:
+            input_tokens = self.slm.count_tokens(query)
+            output_tokens = self.slm.count_tokens(response)
+            cost = 0.0
+        return {"input": input_tokens, "output": output_tokens}, cost
 
     # ---------------- METRICS ---------------- #
 
     @staticmethod
     def _calculate_carbon_saved(output_tokens: int) -> float:
-        return (output_tokens / 1000) * (0.15 - 0.005)
+        return output_tokens * CARBON_SAVED_PER_TOK
 
     @staticmethod
     def _calculate_water_saved(output_tokens: int) -> float:
-        return (output_tokens / 1000) * (2.5 - 0.08)
+        return output_tokens * WATER_SAVED_PER_TOK
 
     @staticmethod
     def _calculate_emissions_carbon(output_tokens: int, model_used: str) -> float:
-        return (output_tokens / 1000) * (0.15 if model_used == "Mixtral" else 0.005)
+        return output_tokens * (CARBON_LLM_PER_TOK if model_used == "Mixtral" else CARBON_SLM_PER_TOK)
 
     @staticmethod
     def _calculate_emissions_water(output_tokens: int, model_used: str) -> float:
-        return (output_tokens / 1000) * (2.5 if model_used == "Mixtral" else 0.08)
+        return output_tokens * (WATER_LLM_PER_TOK if model_used == "Mixtral" else WATER_SLM_PER_TOK)
 
     def get_orchestrator_stats(self) -> dict:
         return {
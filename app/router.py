@@ -1,5 +1,18 @@
 from __future__ import annotations
 
+import logging
+import re
+from functools import lru_cache
+
+from app.impact import (
+    CARBON_LLM_PER_TOK,
+    CARBON_SLM_PER_TOK,
+    WATER_LLM_PER_TOK,
+    WATER_SLM_PER_TOK,
+)
+
+logger = logging.getLogger(__name__)
+
 
 # Keyword patterns for classification
 SIMPLE_KEYWORDS = {
@@ -22,29 +35,57 @@ COMPLEX_KEYWORDS = {
 }
 
 
-def _keyword_score(query: str, keywords: set) -> int:
-    """Count keyword matches in query."""
-    query_lower = query.lower()
-    return sum(1 for keyword in keywords if keyword in query_lower)
+# (carbon g, water ml) per token by model (coefficients live in app.impact)
+_COEFFS = {
+    "SLM": (CARBON_SLM_PER_TOK, WATER_SLM_PER_TOK),
+    "LLM": (CARBON_LLM_PER_TOK, WATER_LLM_PER_TOK),
+}
 
 
-def _estimate_response_tokens(query: str, route: str) -> int:
+def _compile_keywords(keywords) -> re.Pattern:
+    """
+    Compile a keyword set into one regex matched in a single scan.
+    
+    The alternation sits in a zero-width lookahead so overlapping keywords
+    are all reported; longer phrases are tried first.
+    """
+    alternation = "|".join(map(re.escape, sorted(keywords, key=len, reverse=True)))
+    return re.compile(f"(?=({alternation}))")
+
+
+_SIMPLE_RE = _compile_keywords(SIMPLE_KEYWORDS)
+_COMPLEX_RE = _compile_keywords(COMPLEX_KEYWORDS)
+
+# Queries expected to get a long answer (essay/story/code generation)
+LONG_RESPONSE_KEYWORDS = {
+    "essay", "story", "write", "compose", "code", "function",
+    "explain in detail", "how would", "design", "architecture"
+}
+# Only presence matters here, so a plain search is enough (no lookahead)
+_LONG_RESPONSE_RE = re.compile(
+    "|".join(map(re.escape, sorted(LONG_RESPONSE_KEYWORDS, key=len, reverse=True)))
+)
+
+
+def _keyword_score(query_lower: str, pattern: re.Pattern) -> int:
+    """Count distinct keywords of a compiled keyword set found in an already-lowercased query."""
+    return len({m.group(1) for m in pattern.finditer(query_lower)})
+
+
+@lru_cache(maxsize=4096)
+def _estimate_response_tokens(query_lower: str, route: str) -> int:
     """
     Estimate number of tokens in the response based on query type.
     
+    query_lower must already be lowercased.
+    
     Rough estimation:
     - Simple factual query: 50-100 tokens (short answer)
     - Complex query: 200-500 tokens (longer explanation)
     - Very complex (essay, code): 1000+ tokens
     """
-    query_lower = query.lower()
-    
     # Check for essay/story/code generation (very long responses)
-    long_response_keywords = {
-        "essay", "story", "write", "compose", "code", "function",
-        "explain in detail", "how would", "design", "architecture"
-    }
-    if any(keyword in query_lower for keyword in long_response_keywords):
+    if _LONG_RESPONSE_RE.search(query_lower):
         return 300  # Long response expected
     
     # Simple queries usually get short answers
@@ -59,19 +100,34 @@ def build_router():
     return None
 
 
+def _normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so equivalent queries share cache entries."""
+    return " ".join(query.lower().split())
+
+
 def classify_query(router, query: str) -> str:
     """
     Classify query into Simple or Complex using keyword matching.
     
     Simple: Factual recall, basic math, definitions, lookups
     Complex: Code, reasoning, analysis, creative writing, planning
+    
+    Results are memoized on the normalized (lowercased, whitespace-collapsed)
+    query; _classify_cached.cache_clear() resets the cache.
     """
-    simple_score = _keyword_score(query, SIMPLE_KEYWORDS)
-    complex_score = _keyword_score(query, COMPLEX_KEYWORDS)
+    return _classify_cached(_normalize_query(query))
+
+
+@lru_cache(maxsize=4096)
+def _classify_cached(query_norm: str) -> str:
+    """classify_query for an already-normalized query."""
+    simple_score = _keyword_score(query_norm, _SIMPLE_RE)
+    complex_score = _keyword_score(query_norm, _COMPLEX_RE)
     
-    # Debug logging
-    print(f"📊 Query: '{query}'")
-    print(f"   Simple score: {simple_score}, Complex score: {complex_score}")
+    logger.debug(
+        "📊 Query: '%s' — Simple score: %d, Complex score: %d",
+        query_norm, simple_score, complex_score
+    )
     
     # If Simple has more matches, route to Simple
     if simple_score > complex_score and simple_score > 0:
@@ -81,15 +137,14 @@ def classify_query(router, query: str) -> str:
         result = "Complex"
     # Tie-breaker: check for specific patterns
     elif simple_score == complex_score:
-        query_lower = query.lower()
-        if any(query_lower.startswith(prefix) for prefix in ["what is", "how many", "who is", "what are", "when", "where"]):
+        if any(query_norm.startswith(prefix) for prefix in ["what is", "how many", "who is", "what are", "when", "where"]):
             result = "Simple"
         else:
             result = "Complex"
     else:
         result = "Complex"
     
-    print(f"   ✅ Routed to: {result}\n")
+    logger.debug("   ✅ Routed to: %s", result)
     return result
 
 
@@ -103,51 +158,56 @@ def estimate_emissions(query: str, route: str, model: str) -> dict:
     Carbon/Water per 1000 tokens (token-normalized):
     - LLM: 0.15g CO2, 2.5ml water per 1000 tokens
     - SLM: 0.005g CO2, 0.08ml water per 1000 tokens
-    """
-    
-    # Carbon and water per 1000 tokens (normalized)
-    LLM_CARBON_PER_1K_TOKENS = 0.15   # grams
-    LLM_WATER_PER_1K_TOKENS = 2.5     # ml
-    SLM_CARBON_PER_1K_TOKENS = 0.005  # grams
-    SLM_WATER_PER_1K_TOKENS = 0.08    # ml
     
+    Results are memoized on the normalized query, route and model.
+    """
+    carbon_saved, water_saved, carbon, water = _estimate_emissions_cached(
+        _normalize_query(query), route, model
+    )
+    return {
+        "carbon_saved_g": carbon_saved,
+        "water_saved_ml": water_saved,
+        "emissions_carbon_g": carbon,
+        "emissions_water_ml": water,
+    }
+
+
+@lru_cache(maxsize=4096)
+def _estimate_emissions_cached(query_norm: str, route: str, model: str) -> tuple:
+    """(carbon_saved_g, water_saved_ml, emissions_carbon_g, emissions_water_ml), rounded."""
     # Estimate response tokens
-    response_tokens = _estimate_response_tokens(query, route)
+    response_tokens = _estimate_response_tokens(query_norm, route)
     
     # Input tokens (query itself)
-    input_tokens = len(query.split()) * 1.3  # Rough estimate: 1.3 tokens per word
+    input_tokens = len(query_norm.split()) * 1.3  # Rough estimate: 1.3 tokens per word
     
     # Total tokens
     total_tokens = input_tokens + response_tokens
     
-    if model == "SLM":
-        carbon = (SLM_CARBON_PER_1K_TOKENS * total_tokens) / 1000
-        water = (SLM_WATER_PER_1K_TOKENS * total_tokens) / 1000
-    else:  # LLM
-        carbon = (LLM_CARBON_PER_1K_TOKENS * total_tokens) / 1000
-        water = (LLM_WATER_PER_1K_TOKENS * total_tokens) / 1000
+    carbon_per_tok, water_per_tok = _COEFFS["SLM" if model == "SLM" else "LLM"]
+    carbon = total_tokens * carbon_per_tok
+    water = total_tokens * water_per_tok
     
     # Calculate savings: what we saved by NOT using LLM
     if model == "SLM":
-        llm_carbon = (LLM_CARBON_PER_1K_TOKENS * total_tokens) / 1000
-        llm_water = (LLM_WATER_PER_1K_TOKENS * total_tokens) / 1000
-        carbon_saved = llm_carbon - carbon
-        water_saved = llm_water - water
+        llm_carbon_per_tok, llm_water_per_tok = _COEFFS["LLM"]
+        carbon_saved = total_tokens * llm_carbon_per_tok - carbon
+        water_saved = total_tokens * llm_water_per_tok - water
     else:
         # No savings if we used LLM (no alternative)
         carbon_saved = 0
         water_saved = 0
     
-    print(f"🌍 Emissions Estimate:")
-    print(f"   Input tokens: {input_tokens:.0f}")
-    print(f"   Response tokens: {response_tokens}")
-    print(f"   Total tokens: {total_tokens:.0f}")
-    print(f"   {model} emissions: {carbon:.4f}g CO2, {water:.2f}ml water")
-    print(f"   Savings: {carbon_saved:.4f}g CO2, {water_saved:.2f}ml water\n")
-    
-    return {
-        "carbon_saved_g": round(carbon_saved, 4),
-        "water_saved_ml": round(water_saved, 2),
-        "emissions_carbon_g": round(carbon, 4),
-        "emissions_water_ml": round(water, 2),
-    }
\ No newline at end of file
+    logger.debug(
+        "🌍 Emissions Estimate: input tokens %.0f, response tokens %d, total tokens %.0f; "
+        "%s emissions: %.4fg CO2, %.2fml water; savings: %.4fg CO2, %.2fml water",
+        input_tokens, response_tokens, total_tokens,
+        model, carbon, water, carbon_saved, water_saved
+    )
+    
+    return (
+        round(carbon_saved, 4),
+        round(water_saved, 2),
+        round(carbon, 4),
+        round(water, 2),
+    )
@@ -4,9 +4,66 @@ Fast, efficient, and completely free
 """
 
 from __future__ import annotations
-from typing import Optional
+import asyncio
+import functools
+import logging
+import os
+import multiprocessing
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+import httpx
+import orjson
 import torch
 
+logger = logging.getLogger(__name__)
+
+
+def _cpu_supports_bf16() -> bool:
+    """True if the CPU has native BF16 arithmetic (avx512_bf16)"""
+    is_supported = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    if is_supported is not None:
+        return is_supported()
+    
+    # Older torch: read the CPU flags directly
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        with open("/proc/cpuinfo") as f:
+            return "avx512_bf16" in f.read()
+    except OSError:
+        return False
+
+
+def prefetch_model_files(model_name: str) -> str:
+    """
+    Download a model snapshot and read its weights through once
+    
+    Intended to run in a separate process at startup: the download and
+    file hashing happen off this process's GIL, and the in-process load
+    that follows finds the files in the HF cache and the OS page cache.
+    
+    Returns:
+        Local snapshot directory
+    """
+    from huggingface_hub import snapshot_download
+    
+    snapshot_dir = snapshot_download(
+        model_name,
+        allow_patterns=["*.json", "*.safetensors", "tokenizer.model"]
+    )
+    
+    buffer = bytearray(16 * 1024 * 1024)
+    for weights_file in Path(snapshot_dir).glob("*.safetensors"):
+        with open(weights_file, "rb") as f:
+            while f.readinto(buffer):
+                pass
+    
+    return snapshot_dir
+
 
 class SLMHandler:
     """
@@ -16,50 +73,240 @@ class SLMHandler:
     
     MODEL_NAME = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
     
+    # Exact-match (prompt, max_tokens) responses kept for repeated queries
+    RESPONSE_CACHE_SIZE = 512
+    
     def __init__(self):
         """Initialize SLM handler"""
         self.model = None
         self.tokenizer = None
+        self.generation_config = None
+        self._template_ids: Optional[Tuple[List[int], List[int]]] = None
+        # Repeated texts (same query asked again) skip the tokenizer
+        self._count_tokens_cached = functools.lru_cache(maxsize=2048)(self._count_tokens_uncached)
+        # LRU of generated responses; batches run in worker threads, so guarded
+        self._cache: OrderedDict[Tuple[str, int], str] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Held for the whole load, so callers arriving while preload() is
+        # still loading wait for it instead of starting a second load
+        self._init_lock = threading.Lock()
+        # One generate() at a time on the local model (batches and streams
+        # share its weights and, on CUDA, its static KV cache)
+        self._generate_lock = threading.Lock()
         self._initialized = False
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # OpenAI-compatible completions server (e.g. vLLM or llama.cpp server)
+        # serving MODEL_NAME, like "http://127.0.0.1:8001/v1". When set, generation
+        # goes to the server, whose continuous batching admits new requests
+        # between decode steps; only the tokenizer is loaded locally. Read per
+        # instance (not at import) so a value loaded from .env is picked up.
+        self.server_url = os.getenv("SLM_SERVER_URL")
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def remote(self) -> bool:
+        """True when generation is served by server_url instead of a local model"""
+        return bool(self.server_url)
+    
+    def preload(self) -> bool:
+        """
+        Fetch and load the model ahead of the first query
+        
+        Meant for a background thread started at process start. The
+        snapshot is downloaded and read through in a separate process
+        (off this process's GIL) before the in-process load.
+        
+        Returns:
+            True if initialized successfully
+        """
+        if self._initialized or self.remote:
+            return self.initialize()
+        
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                pool.submit(prefetch_model_files, self.MODEL_NAME).result()
+        except Exception as e:
+            logger.warning("⚠️  SLM prefetch failed, loading directly: %s", e)
+        
+        return self.initialize()
     
     def initialize(self) -> bool:
         """
         Lazy load the model (only when needed)
         First run downloads ~2GB model file
         
+        Thread-safe: concurrent callers block until one load finishes.
+        
         Returns:
             True if initialized successfully
         """
         if self._initialized:
             return True
         
+        with self._init_lock:
+            if self._initialized:
+                return True
+            return self._load()
+    
+    def _load(self) -> bool:
+        """Load tokenizer and model; called by initialize() under the init lock"""
         try:
-            from transformers import AutoTokenizer, AutoModelForCausalLM
+            from transformers import AutoTokenizer, AutoModelForCausalLM, GenerationConfig
             
-            print(f"📥 Loading TinyLlama (device: {self.device})")
-            print(f"   Model: {self.MODEL_NAME}")
-            print("   ⏳ This takes ~30-60 seconds on first run...")
+            logger.info("📥 Loading TinyLlama (device: %s)", "server" if self.remote else self.device)
+            logger.info("   Model: %s", self.MODEL_NAME)
+            logger.info("   ⏳ This takes ~30-60 seconds on first run...")
             
-            self.tokenizer = AutoTokenizer.from_pretrained(self.MODEL_NAME)
+            self.tokenizer = AutoTokenizer.from_pretrained(self.MODEL_NAME, use_fast=True)
+            # Batched prompts are left-padded so generation continues
+            # directly after each prompt's last real token
+            self.tokenizer.padding_side = "left"
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            self._template_ids = self._tokenize_template()
+            
+            if self.remote:
+                # The server holds the weights; the tokenizer is kept for count_tokens
+                self._initialized = True
+                logger.info("✅ TinyLlama served by %s", self.server_url)
+                return True
+            
+            if self.device == "cpu":
+                self._configure_cpu_threads()
+            
+            dtype = self._load_dtype()
+            logger.info("   Weights dtype: %s", dtype)
             
             self.model = AutoModelForCausalLM.from_pretrained(
                 self.MODEL_NAME,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                device_map="auto" if self.device == "cuda" else None
+                torch_dtype=dtype,
+                device_map="auto" if self.device == "cuda" else None,
+                **self._quantization_kwargs()
             )
             
             if self.device == "cpu":
                 self.model = self.model.to(self.device)
+                # INT8 dynamic quantization needs fp32 Linear layers; bf16
+                # weights already halve the bytes read per decode step
+                if self._quantize_enabled() and dtype == torch.float32:
+                    self.model = self._quantize_cpu(self.model)
+            
+            self.model.eval()
+            
+            # Sampling settings shared by every request, built once
+            self.generation_config = GenerationConfig(
+                max_new_tokens=150,
+                temperature=0.7,
+                top_p=0.95,
+                do_sample=True,
+                pad_token_id=self.tokenizer.eos_token_id,
+                use_cache=True
+            )
+            
+            if self.device == "cuda":
+                # Compile forward (generate() calls it per decode step, so
+                # compiling the module wrapper alone would be bypassed). A
+                # static KV cache keeps shapes fixed so CUDA graphs replay
+                # instead of recompiling as the sequence grows.
+                self.generation_config.cache_implementation = "static"
+                self.model.forward = torch.compile(
+                    self.model.forward, mode="reduce-overhead", fullgraph=False
+                )
             
             self._initialized = True
-            print("✅ TinyLlama loaded successfully")
+            logger.info("✅ TinyLlama loaded successfully")
             return True
         
         except Exception as e:
-            print(f"❌ Error loading TinyLlama: {e}")
+            logger.error("❌ Error loading TinyLlama: %s", e)
             return False
     
+    def _load_dtype(self) -> torch.dtype:
+        """
+        Weight dtype: fp16 on CUDA, bf16 on CPUs with native BF16 (AVX-512
+        BF16 / AMX), fp32 otherwise
+        """
+        if self.device == "cuda":
+            return torch.float16
+        if _cpu_supports_bf16():
+            # Let remaining fp32 matmuls use faster reduced-precision kernels
+            torch.set_float32_matmul_precision("high")
+            return torch.bfloat16
+        return torch.float32
+    
+    @staticmethod
+    def _configure_cpu_threads() -> None:
+        """
+        Cap torch's CPU thread pools before loading
+        
+        Intra-op threads are limited to about one per physical core (SMT
+        siblings just contend for the same units during decode), and a
+        single inter-op thread keeps the API's own threads from being
+        oversubscribed.
+        """
+        torch.set_num_threads(max(1, (os.cpu_count() or 2) // 2))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Only settable before the first parallel op in this process
+            pass
+    
+    @staticmethod
+    def _quantize_enabled() -> bool:
+        """
+        Load low-bit weights (4-bit NF4 on CUDA, INT8 Linear layers on CPU)
+        
+        Decode is memory-bound, so fewer bytes per weight means more tokens/s.
+        SLM_QUANTIZE=0 loads full-precision weights instead; it is read at
+        load time so a value from .env is honoured.
+        """
+        return os.getenv("SLM_QUANTIZE", "1") != "0"
+    
+    def _quantization_kwargs(self) -> dict:
+        """
+        from_pretrained kwargs for a 4-bit NF4 load on CUDA
+        
+        Empty (full fp16 load) on CPU, when disabled, or when bitsandbytes
+        isn't installed.
+        """
+        if self.device != "cuda" or not self._quantize_enabled():
+            return {}
+        
+        try:
+            import bitsandbytes  # noqa: F401
+            from transformers import BitsAndBytesConfig
+        except ImportError:
+            logger.warning("⚠️  bitsandbytes not installed, loading TinyLlama in fp16")
+            return {}
+        
+        logger.info("   Quantization: 4-bit NF4 (bitsandbytes)")
+        return {
+            "quantization_config": BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=torch.float16,
+                bnb_4bit_use_double_quant=True
+            )
+        }
+    
+    @staticmethod
+    def _quantize_cpu(model):
+        """
+        Dynamic INT8 quantization of the Linear layers for CPU decode
+        
+        Falls back to the fp32 model if this torch build has no quantized
+        engine available.
+        """
+        try:
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            logger.info("   Quantization: INT8 dynamic (Linear layers)")
+        except Exception as e:
+            logger.warning("⚠️  INT8 quantization unavailable (%s), using fp32", e)
+        return model
+    
     def generate_response(self, prompt: str, max_tokens: int = 150) -> str:
         """
         Generate response using TinyLlama
@@ -71,43 +318,297 @@ class SLMHandler:
         Returns:
             Generated response text
         """
+        return self.generate_batch([prompt], max_tokens=max_tokens)[0]
+    
+    def generate_batch(self, prompts: List[str], max_tokens: int = 150) -> List[str]:
+        """
+        Generate responses for several prompts with one generate() call
+        
+        Prompts are left-padded to a common length so every row's new
+        tokens start at the same position. Prompts answered before (same
+        max_tokens) come from the response cache and skip generation.
+        
+        Args:
+            prompts: User queries/prompts
+            max_tokens: Maximum tokens to generate per prompt
+        
+        Returns:
+            Generated response texts, in prompt order
+        """
+        # Identical prompts in one batch are generated once and shared
+        unique_prompts = list(dict.fromkeys(prompts))
+        if len(unique_prompts) < len(prompts):
+            by_prompt = dict(zip(unique_prompts, self.generate_batch(unique_prompts, max_tokens)))
+            return [by_prompt[prompt] for prompt in prompts]
+        
         if not self._initialized:
             if not self.initialize():
+                return ["Error: Could not initialize TinyLlama"] * len(prompts)
+        
+        keys = [(prompt, max_tokens) for prompt in prompts]
+        responses = [self._cache_get(key) for key in keys]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if not missing:
+            return responses
+        
+        try:
+            generated = self._generate([prompts[i] for i in missing], max_tokens)
+        except Exception as e:
+            for i in missing:
+                responses[i] = f"Error generating response: {str(e)}"
+            return responses
+        
+        for i, response in zip(missing, generated):
+            responses[i] = response
+            self._cache_put(keys[i], response)
+        return responses
+    
+    async def agenerate_response(self, prompt: str, max_tokens: int = 150) -> str:
+        """
+        Async single-prompt generation against server_url
+        
+        Each request is sent on its own so the server can schedule it
+        into its running batch immediately. Local models should go
+        through BatchingSLM instead.
+        """
+        key = (prompt, max_tokens)
+        response = self._cache_get(key)
+        if response is not None:
+            return response
+        
+        if not self._initialized:
+            if not await asyncio.to_thread(self.initialize):
                 return "Error: Could not initialize TinyLlama"
         
         try:
-            # Format prompt as chat
-            formatted_prompt = f"User: {prompt}\nAssistant:"
-            
-            # Tokenize
-            inputs = self.tokenizer(
-                formatted_prompt,
-                return_tensors="pt",
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(base_url=self.server_url, timeout=120)
+            result = await self._async_client.post(
+                "/completions", json=self._completion_payload([prompt], max_tokens)
+            )
+            result.raise_for_status()
+            response = self._completion_texts(result.json())[0]
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+        
+        self._cache_put(key, response)
+        return response
+    
+    def _generate(self, prompts: List[str], max_tokens: int) -> List[str]:
+        """Generate for prompts locally, or on server_url when configured"""
+        if self.remote:
+            return self._generate_remote(prompts, max_tokens)
+        return self._generate_local(prompts, max_tokens)
+    
+    def _generate_remote(self, prompts: List[str], max_tokens: int) -> List[str]:
+        """One completions request for all prompts"""
+        if self._client is None:
+            self._client = httpx.Client(base_url=self.server_url, timeout=120)
+        result = self._client.post("/completions", json=self._completion_payload(prompts, max_tokens))
+        result.raise_for_status()
+        return self._completion_texts(result.json())
+    
+    def _completion_payload(self, prompts: List[str], max_tokens: int) -> dict:
+        """OpenAI-style completions body, same prompt format and sampling as local"""
+        return {
+            "model": self.MODEL_NAME,
+            "prompt": [f"User: {prompt}\nAssistant:" for prompt in prompts],
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "top_p": 0.95,
+            "stream": False
+        }
+    
+    @staticmethod
+    def _completion_texts(result: dict) -> List[str]:
+        """Choice texts in prompt order"""
+        choices = sorted(result["choices"], key=lambda choice: choice["index"])
+        return [choice["text"].strip() for choice in choices]
+    
+    async def aclose(self) -> None:
+        """Close HTTP clients used for server_url"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+    
+    def _encode(self, prompts: List[str]):
+        """Chat-format and tokenize prompts into a left-padded batch on the model's device"""
+        if self._template_ids is not None:
+            # Only the user text is tokenized; the chat template's ids are reused
+            prefix_ids, suffix_ids = self._template_ids
+            prompt_ids = self.tokenizer(
+                prompts,
+                add_special_tokens=False,
                 truncation=True,
-                max_length=512
+                max_length=512 - len(prefix_ids) - len(suffix_ids)
+            )["input_ids"]
+            return self.tokenizer.pad(
+                {"input_ids": [prefix_ids + ids + suffix_ids for ids in prompt_ids]},
+                padding=True,
+                return_tensors="pt"
             ).to(self.device)
-            
-            # Generate
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=max_tokens,
-                    temperature=0.7,
-                    top_p=0.95,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                )
-            
-            # Decode
-            response = self.tokenizer.decode(
-                outputs[0][inputs["input_ids"].shape[1]:],
-                skip_special_tokens=True
+        
+        # Format prompts as chat
+        formatted_prompts = [f"User: {prompt}\nAssistant:" for prompt in prompts]
+        
+        # Tokenize
+        return self.tokenizer(
+            formatted_prompts,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=512
+        ).to(self.device)
+    
+    def _tokenize_template(self) -> Optional[Tuple[List[int], List[int]]]:
+        """
+        Token ids of the chat template around the user text, "User: " and
+        "\nAssistant:" (prefix includes BOS)
+        
+        Derived by tokenizing the whole template around probe prompts and
+        only used if prefix + prompt + suffix reproduces those ids exactly;
+        otherwise None, and prompts are tokenized as full strings.
+        """
+        def ids(text: str, special: bool = True) -> List[int]:
+            return self.tokenizer(text, add_special_tokens=special)["input_ids"]
+        
+        probe_full = ids("User: Hello world\nAssistant:")
+        probe_ids = ids("Hello world", special=False)
+        prefix_ids = ids("User:")
+        prefix_len = len(prefix_ids)
+        if probe_full[:prefix_len] != prefix_ids or probe_full[prefix_len:prefix_len + len(probe_ids)] != probe_ids:
+            return None
+        suffix_ids = probe_full[prefix_len + len(probe_ids):]
+        
+        check = "What is 2+2? Explain."
+        if ids(f"User: {check}\nAssistant:") != prefix_ids + ids(check, special=False) + suffix_ids:
+            return None
+        return prefix_ids, suffix_ids
+    
+    def _generate_local(self, prompts: List[str], max_tokens: int) -> List[str]:
+        """Run one left-padded generate() over prompts and decode the new tokens"""
+        inputs = self._encode(prompts)
+        
+        # Generate (inference_mode also skips autograd version counters)
+        with self._generate_lock, torch.inference_mode():
+            outputs = self.model.generate(
+                **inputs,
+                generation_config=self.generation_config,
+                max_new_tokens=max_tokens,
             )
-            
-            return response.strip()
         
+        # Decode only the generated part of each row
+        responses = self.tokenizer.batch_decode(
+            outputs[:, inputs["input_ids"].shape[1]:],
+            skip_special_tokens=True
+        )
+        
+        return [response.strip() for response in responses]
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 150) -> Iterator[str]:
+        """
+        Generate a response as it is decoded, yielding text chunks
+        
+        Lets callers show the first words (and measure time to first
+        token) without waiting for the full decode. The complete text is
+        added to the response cache once the stream finishes.
+        
+        Args:
+            prompt: User query/prompt
+            max_tokens: Maximum tokens to generate
+        
+        Yields:
+            Successive pieces of the response text
+        """
+        key = (prompt, max_tokens)
+        cached = self._cache_get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        if not self._initialized:
+            if not self.initialize():
+                yield "Error: Could not initialize TinyLlama"
+                return
+        
+        chunks = []
+        try:
+            stream = self._stream_remote if self.remote else self._stream_local
+            for chunk in stream(prompt, max_tokens):
+                # Leading whitespace is dropped, as with the non-streamed .strip()
+                if not chunks:
+                    chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                chunks.append(chunk)
+                yield chunk
         except Exception as e:
-            return f"Error generating response: {str(e)}"
+            yield f"Error generating response: {str(e)}"
+            return
+        
+        self._cache_put(key, "".join(chunks).strip())
+    
+    def _stream_local(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        """Run generate() on a worker thread and read decoded text from a streamer"""
+        from transformers import TextIteratorStreamer
+        
+        inputs = self._encode([prompt])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+        
+        def run():
+            try:
+                with self._generate_lock, torch.inference_mode():
+                    self.model.generate(
+                        **inputs,
+                        generation_config=self.generation_config,
+                        max_new_tokens=max_tokens,
+                        streamer=streamer,
+                    )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()  # unblock the reading side
+        
+        thread = threading.Thread(target=run, name="slm-stream", daemon=True)
+        thread.start()
+        yield from streamer
+        thread.join()
+        if errors:
+            raise errors[0]
+    
+    def _stream_remote(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        """Read a streamed (server-sent events) completion from server_url"""
+        if self._client is None:
+            self._client = httpx.Client(base_url=self.server_url, timeout=120)
+        payload = {**self._completion_payload([prompt], max_tokens), "stream": True}
+        with self._client.stream("POST", "/completions", json=payload) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                yield orjson.loads(data)["choices"][0]["text"]
+    
+    def _cache_get(self, key: Tuple[str, int]) -> Optional[str]:
+        """Cached response for (prompt, max_tokens), marked most recently used"""
+        with self._cache_lock:
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+            return response
+    
+    def _cache_put(self, key: Tuple[str, int], response: str) -> None:
+        """Store a response, evicting the least recently used past RESPONSE_CACHE_SIZE"""
+        with self._cache_lock:
+            self._cache[key] = response
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
     
     def count_tokens(self, text: str) -> int:
         """
@@ -123,12 +624,21 @@ class SLMHandler:
             self.initialize()
         
         try:
-            tokens = self.tokenizer.encode(text)
-            return len(tokens)
-        except:
+            return self._count_tokens_cached(text)
+        except Exception:
             # Rough estimate: ~4 characters per token
             return int(len(text) / 4)
     
+    def _count_tokens_uncached(self, text: str) -> int:
+        """Token count from the fast (Rust) tokenizer, without building an ids list"""
+        return self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_length=True,
+            truncation=True,
+            max_length=2048
+        )["length"][0]
+    
     def get_model_info(self) -> dict:
         """Get information about the model"""
         return {
@@ -163,4 +673,87 @@ class SLMHandler:
                 "gpu_optional": "But recommended",
                 "download_size": "~2GB"
             }
-        }
\ No newline at end of file
+        }
+
+
+class BatchingSLM:
+    """
+    Coalesces concurrent SLM requests into batched generate() calls
+    
+    Requests arriving within a short window (default 5 ms) are drained
+    together, up to max_batch, and run as one left-padded batch so the
+    per-step weight reads are shared across callers. Each caller awaits
+    its own future and gets back only its own response.
+    """
+    
+    def __init__(self, slm: SLMHandler, max_batch: int = 8, window_s: float = 0.005):
+        """
+        Args:
+            slm: Handler that runs the model
+            max_batch: Maximum prompts per generate() call
+            window_s: How long to wait for more requests after the first
+        """
+        self.slm = slm
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner_task: Optional[asyncio.Task] = None
+    
+    async def submit(self, prompt: str, max_tokens: int = 150) -> str:
+        """
+        Queue a prompt for the next batch and wait for its response
+        
+        Returns:
+            Generated response text
+        """
+        # Created lazily so the queue and runner bind to the serving loop
+        # (and recreated if that loop has since been replaced)
+        loop = asyncio.get_running_loop()
+        if self._runner_task is None or self._runner_task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._runner_task = asyncio.create_task(self._runner())
+        
+        future = loop.create_future()
+        await self._queue.put((prompt, max_tokens, future))
+        return await future
+    
+    async def _runner(self) -> None:
+        """Collect queued requests into batches and run them in a worker thread"""
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.window_s)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            # Requests with different token budgets go in separate batches
+            groups = {}
+            for prompt, max_tokens, future in batch:
+                groups.setdefault(max_tokens, []).append((prompt, future))
+            
+            for max_tokens, items in groups.items():
+                prompts = [prompt for prompt, _ in items]
+                try:
+                    responses = await asyncio.to_thread(
+                        self.slm.generate_batch, prompts, max_tokens
+                    )
+                except Exception as e:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                
+                for (_, future), response in zip(items, responses):
+                    # The caller may have gone away (cancelled request)
+                    if not future.done():
+                        future.set_result(response)
+    
+    async def aclose(self) -> None:
+        """Stop the batching task"""
+        if self._runner_task is not None:
+            self._runner_task.cancel()
+            try:
+                await self._runner_task
+            except asyncio.CancelledError:
+                pass
+            self._runner_task = None
+            self._queue = None
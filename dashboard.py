@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-import requests
+from collections import OrderedDict, deque
+from itertools import islice
+
+import httpx
+import orjson
+import pandas as pd
 import streamlit as st
-import plotly.graph_objects as go
 from datetime import datetime
 
 # Page configuration
@@ -13,8 +17,12 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Static page HTML, defined once at module level and injected each run.
+# (Streamlit drops any element a rerun doesn't emit again, so the CSS
+# can't be skipped after the first run; only rebuilding it is avoided.)
+
 # Custom CSS
-st.markdown("""
+PAGE_CSS = """
     <style>
     :root {
         --primary: #1a472a;
@@ -65,6 +73,15 @@ st.markdown("""
         transition: all 0.3s ease;
     }
     
+    .metric-row {
+        display: flex;
+        gap: 1rem;
+    }
+    
+    .metric-row > .metric-container {
+        flex: 1;
+    }
+    
     .metric-container:hover {
         box-shadow: 0 8px 24px rgba(82, 183, 136, 0.15);
         transform: translateY(-4px);
@@ -131,30 +148,238 @@ st.markdown("""
         font-size: 0.85rem;
         color: var(--text-light);
     }
+    
+    .flex-row {
+        display: flex;
+        gap: 1rem;
+        margin-bottom: 0.75rem;
+    }
+    
+    .flex-row > div {
+        flex: 1;
+    }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+HEADER_HTML = """
+    <div class="header-section">
+        <h1>🌱 GreenRoute AI</h1>
+        <p>Intelligent Query Routing with User Control — AUTO + MANUAL OVERRIDE</p>
+    </div>
+"""
+
+FOOTER_HTML = """
+    <div style="text-align: center; color: #999; padding: 2rem 0; font-size: 0.9rem;">
+        <p><strong>🌱 GreenRoute AI</strong> — Professional Query Routing with User Control</p>
+        <p>Automatic Intelligence + Manual Override = Perfect UX</p>
+    </div>
+"""
+
+# Mode explanation shown under the selector, by API mode
+MODE_INFO_HTML = {
+    "AUTO": """
+        <div class="mode-info">
+        ✅ <strong>Automatic Mode (Default)</strong><br>
+        System will intelligently decide between TinyLlama and Mixtral based on your query complexity.
+        </div>
+        """,
+    "LLM": """
+        <div class="mode-info">
+        🧠 <strong>Force LLM (Mixtral 8x7B)</strong><br>
+        You're forcing the powerful model. Use for complex reasoning, code generation, analysis.
+        </div>
+        """,
+    "SLM": """
+        <div class="mode-info">
+        ⚡ <strong>Force SLM (TinyLlama 1.1B)</strong><br>
+        You're forcing the fast model. Use for simple questions and quick lookups.
+        </div>
+        """
+}
+
+# Badges by routing mode / model: full labels for the result, short ones for history
+MODE_BADGE = {
+    "Automatic": '<span class="badge badge-auto" style="background: #d4edda; color: #155724;">🤖 Automatic</span>',
+    "User Override": '<span class="badge badge-override">⚙️ User Override</span>'
+}
+MODEL_BADGE = {
+    "TinyLlama": '<span class="badge badge-tinyllama">⚡ TinyLlama</span>',
+    "Mixtral": '<span class="badge badge-mixtral">🧠 Mixtral</span>'
+}
+HISTORY_MODE_BADGE = {
+    "Automatic": '<span class="badge badge-auto" style="background: #d4edda; color: #155724;">Auto</span>',
+    "User Override": '<span class="badge badge-override">Override</span>'
+}
+HISTORY_MODEL_BADGE = {
+    "TinyLlama": '<span class="badge badge-tinyllama">TinyLlama</span>',
+    "Mixtral": '<span class="badge badge-mixtral">Mixtral</span>'
+}
+# Mode and model cells of a history entry, for each of the four combinations
+HISTORY_ROW_HEAD = {
+    (mode, model): (
+        f"<div><strong>Mode:</strong><br>{mode_badge}</div>"
+        f"<div><strong>Model:</strong><br>{model_badge}</div>"
+    )
+    for mode, mode_badge in HISTORY_MODE_BADGE.items()
+    for model, model_badge in HISTORY_MODEL_BADGE.items()
+}
+
+# One session total in the Environmental Impact row
+METRIC_CARD_HTML = (
+    '<div class="metric-container">'
+    '<div class="metric-label">{label}</div>'
+    '<div class="metric-value">{value}</div>'
+    '</div>'
+)
+
+# Routing decision shown above a new answer
+ROUTE_HTML = """
+    <div class="flex-row">
+        <div><strong>Routing Mode:</strong><br>{mode_badge}</div>
+        <div><strong>Model Used:</strong><br>{model_badge}</div>
+        <div><strong>Complexity:</strong><br><strong>{complexity}</strong></div>
+    </div>
+"""
+
+# Per-query performance and impact, shown below a new answer
+IMPACT_HTML = """
+    <div class="flex-row">
+        <div>
+            <strong>⏱️ Performance:</strong><br>
+            First token: <code>{ttft_ms:.0f}ms</code><br>
+            Latency: <code>{latency_ms:.0f}ms</code><br>
+            Tokens: <code>{input_tokens} → {output_tokens}</code>
+        </div>
+        <div>
+            <strong>💚 Emissions:</strong><br>
+            CO₂: <code>{emissions_carbon:.4f}g</code><br>
+            Water: <code>{emissions_water:.2f}ml</code>
+        </div>
+        <div>
+            <strong>✅ Savings:</strong><br>
+            CO₂ saved: <code>{carbon_saved:.4f}g</code><br>
+            Water saved: <code>{water_saved:.2f}ml</code>
+        </div>
+    </div>
+"""
+
+# Routing details of one history entry, sent as a single markdown element
+HISTORY_DETAIL_HTML = """
+    <div class="flex-row">
+        {row_head}
+        <div><strong>Complexity:</strong><br>{complexity}</div>
+        <div><strong>Time:</strong><br>{time}</div>
+    </div>
+    <hr>
+    <p><strong>Routing Reason:</strong> {reason}</p>
+    <div class="flex-row">
+        <div>
+            <strong>Emissions:</strong><br>
+            • CO₂: {emissions_carbon:.4f}g<br>
+            • Water: {emissions_water:.2f}ml<br>
+            • Latency: {latency_ms:.0f}ms
+        </div>
+        <div>
+            <strong>Saved:</strong><br>
+            • CO₂: {carbon_saved:.4f}g ✅<br>
+            • Water: {water_saved:.2f}ml ✅
+        </div>
+    </div>
+"""
+
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 API_URL = "http://localhost:8000/query"
+STREAM_URL = API_URL + "/stream"
+HISTORY_SIZE = 200  # most recent queries kept in the history panel
+HISTORY_ROWS = 20  # of those, rows shown in the history table
+RESPONSE_CACHE_SIZE = 64  # (query, mode) results kept per session
+# Starts of the error / timeout / empty-answer texts the API returns in place of an answer
+FAILURE_PREFIXES = ("Error", "⏱️", "⚠️")
+
+# Answer box, re-rendered as streamed text arrives
+ANSWER_HTML = """
+    <div style="
+        background-color: #0f172a;
+        color: #ffffff;
+        padding: 18px;
+        border-radius: 10px;
+        font-size: 1.05rem;
+        line-height: 1.6;
+        border-left: 5px solid #52b788;
+    ">
+        {answer}
+    </div>
+"""
+
+
+@st.cache_resource
+def api_client() -> httpx.Client:
+    """Keep-alive HTTP client shared by all sessions (httpx clients are thread-safe)"""
+    return httpx.Client(
+        timeout=180,  # 3 minutes for first-load queries
+        headers={"Content-Type": "application/json"},  # bodies are pre-encoded with orjson
+        limits=httpx.Limits(max_keepalive_connections=4)
+    )
+
+
+def metrics_html() -> str:
+    """
+    The four session totals as one flex row of metric cards
+    
+    Rebuilt only after a query changed the totals; other reruns reuse
+    the string kept in session state.
+    """
+    state = st.session_state
+    if state.get("_metrics_dirty", True):
+        totals = state.totals
+        cards = "".join(
+            METRIC_CARD_HTML.format(label=label, value=value)
+            for label, value in (
+                ("💚 Carbon Saved", f"{totals['carbon_saved']:.4f}g"),
+                ("💧 Water Saved", f"{totals['water_saved']:.2f}ml"),
+                ("⚡ CO₂ Emitted", f"{totals['emissions_carbon']:.4f}g"),
+                ("🌊 Water Used", f"{totals['emissions_water']:.2f}ml")
+            )
+        )
+        state._metrics_html = f'<div class="metric-row">{cards}</div>'
+        state._metrics_dirty = False
+    return state._metrics_html
+
+
+def stream_events(payload: dict):
+    """Events from /query/stream: "start", one "token" per chunk, then "done" """
+    with api_client().stream("POST", STREAM_URL, content=orjson.dumps(payload)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield orjson.loads(line)
+
+
+def replay_events(result: dict):
+    """The same event sequence rebuilt from a cached "done" result"""
+    yield {**result, "event": "start"}
+    yield {"event": "token", "text": result["response"]}
+    yield result
+
 
 # Initialize session state
-if "total_carbon_saved" not in st.session_state:
-    st.session_state.total_carbon_saved = 0.0
-if "total_water_saved" not in st.session_state:
-    st.session_state.total_water_saved = 0.0
-if "total_emissions_carbon" not in st.session_state:
-    st.session_state.total_emissions_carbon = 0.0
-if "total_emissions_water" not in st.session_state:
-    st.session_state.total_emissions_water = 0.0
+if "totals" not in st.session_state:
+    # One dict updated in place: a single session-state key for all four totals
+    st.session_state.totals = {
+        "carbon_saved": 0.0,
+        "water_saved": 0.0,
+        "emissions_carbon": 0.0,
+        "emissions_water": 0.0
+    }
 if "query_history" not in st.session_state:
-    st.session_state.query_history = []
+    # Ring buffer: long demo sessions keep only the latest entries
+    st.session_state.query_history = deque(maxlen=HISTORY_SIZE)
+
+response_cache = st.session_state.setdefault("_resp_cache", OrderedDict())
 
 # Header
-st.markdown("""
-    <div class="header-section">
-        <h1>🌱 GreenRoute AI</h1>
-        <p>Intelligent Query Routing with User Control — AUTO + MANUAL OVERRIDE</p>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 # Info Section
 col_info1, col_info2 = st.columns(2)
@@ -184,172 +409,175 @@ st.divider()
 # Main Query Section
 st.markdown('<h2 class="section-header">❓ Ask Your Question</h2>', unsafe_allow_html=True)
 
-# Create input with model selector
-col_query, col_mode = st.columns([3, 1])
-
-with col_query:
-    user_query = st.text_input(
-        "Enter your question",
-        placeholder="Type your question here...",
-        label_visibility="collapsed"
-    )
-
-with col_mode:
-    mode_option = st.selectbox(
-        "Model Mode",
-        ["AUTO (Recommended)", "Force LLM", "Force SLM"],
-        label_visibility="collapsed"
-    )
-
 # Map UI selection to API mode
 mode_map = {
     "AUTO (Recommended)": "AUTO",
     "Force LLM": "LLM",
     "Force SLM": "SLM"
 }
-selected_mode = mode_map[mode_option]
 
-# Show mode explanation
-if selected_mode == "AUTO":
-    st.markdown(
-        """
-        <div class="mode-info">
-        ✅ <strong>Automatic Mode (Default)</strong><br>
-        System will intelligently decide between TinyLlama and Mixtral based on your query complexity.
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-elif selected_mode == "LLM":
-    st.markdown(
-        """
-        <div class="mode-info">
-        🧠 <strong>Force LLM (Mixtral 8x7B)</strong><br>
-        You're forcing the powerful model. Use for complex reasoning, code generation, analysis.
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-else:  # SLM
-    st.markdown(
-        """
-        <div class="mode-info">
-        ⚡ <strong>Force SLM (TinyLlama 1.1B)</strong><br>
-        You're forcing the fast model. Use for simple questions and quick lookups.
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+
+@st.fragment
+def query_inputs() -> None:
+    """
+    Question box and mode selector with its explanation
+    
+    As a fragment, editing these reruns only this block instead of the
+    whole page; Send Query (outside it) still runs the full script.
+    """
+    # Create input with model selector
+    col_query, col_mode = st.columns([3, 1])
+    
+    with col_query:
+        st.text_input(
+            "Enter your question",
+            placeholder="Type your question here...",
+            label_visibility="collapsed",
+            key="user_query"
+        )
+    
+    with col_mode:
+        st.selectbox(
+            "Model Mode",
+            ["AUTO (Recommended)", "Force LLM", "Force SLM"],
+            label_visibility="collapsed",
+            key="mode_option"
+        )
+    
+    # Show mode explanation
+    st.markdown(MODE_INFO_HTML[mode_map[st.session_state.mode_option]], unsafe_allow_html=True)
+
+
+query_inputs()
+user_query = st.session_state.user_query
+selected_mode = mode_map[st.session_state.mode_option]
 
 # Submit button
-submit_button = st.button("🚀 Send Query", use_container_width=True)
+submit_button = st.button("🚀 Send Query", width="stretch")
 
 # Process query
 if submit_button and user_query:
     try:
-        with st.spinner("🔍 Processing your query... (First query may take 30-60 seconds as model loads)"):
-            payload = {
-                "query": user_query,
-                "mode": selected_mode
-            }
-            response = requests.post(API_URL, json=payload, timeout=180)  # Increased to 3 minutes
-            response.raise_for_status()
-            result = response.json()
-        
-        # Update metrics
-        st.session_state.total_carbon_saved += result["carbon_saved_g"]
-        st.session_state.total_water_saved += result["water_saved_ml"]
-        st.session_state.total_emissions_carbon += result["emissions_carbon_g"]
-        st.session_state.total_emissions_water += result["emissions_water_ml"]
-        
-        # Add to history
-        st.session_state.query_history.append({
+        payload = {
             "query": user_query,
-            "mode": result["mode"],
-            "model": result["model_used"],
-            "reason": result["routing_reason"],
-            "complexity_score": result["complexity_score"],
-            "carbon_saved": result["carbon_saved_g"],
-            "water_saved": result["water_saved_ml"],
-            "emissions_carbon": result["emissions_carbon_g"],
-            "emissions_water": result["emissions_water_ml"],
-            "latency_ms": result["latency_ms"],
-            "timestamp": datetime.now()
-        })
-        
-        # Display result
-        st.success("✅ Query Processed Successfully!")
-        
-        # Result breakdown
-        result_col1, result_col2, result_col3 = st.columns(3)
+            "mode": selected_mode
+        }
+        status = st.empty()
         
-        with result_col1:
-            mode_badge = f'<span class="badge badge-auto" style="background: #d4edda; color: #155724;">🤖 {result["mode"]}</span>' if result["mode"] == "Automatic" else f'<span class="badge badge-override">⚙️ {result["mode"]}</span>'
-            st.write("**Routing Mode:**")
-            st.markdown(mode_badge, unsafe_allow_html=True)
+        # Repeats of a (query, mode) pair are replayed instead of re-asking the API
+        key = (user_query, selected_mode)
+        cached = response_cache.get(key)
+        if cached is not None:
+            response_cache.move_to_end(key)
+            events = replay_events(cached)
+        else:
+            events = stream_events(payload)
         
-        with result_col2:
-            model_badge = f'<span class="badge badge-tinyllama">⚡ TinyLlama</span>' if result["model_used"] == "TinyLlama" else f'<span class="badge badge-mixtral">🧠 Mixtral</span>'
-            st.write("**Model Used:**")
-            st.markdown(model_badge, unsafe_allow_html=True)
-        
-        with result_col3:
-            st.write("**Complexity:**")
-            st.write(f"**{result['complexity_score']}/25**")
-        
-        st.divider()
-        
-        # Routing reason
-        st.info(f"**Why this model?** {result['routing_reason']}")
-        
-        st.divider()
+        # Routing details arrive first, totals last. The spinner stays up
+        # until the answer is done, not just routed.
+        with st.spinner("🔍 Processing your query... (First query may take 30-60 seconds as model loads)"):
+            route = next(events)
+            
+            # Result breakdown
+            st.markdown(
+                ROUTE_HTML.format(
+                    mode_badge=MODE_BADGE[route["mode"]],
+                    model_badge=MODEL_BADGE[route["model_used"]],
+                    # Not scored when the user forced a model
+                    complexity="— (not scored)" if route["complexity_score"] is None else f"{route['complexity_score']}/25"
+                ),
+                unsafe_allow_html=True
+            )
+            
+            st.divider()
+            
+            # Routing reason
+            st.info(f"**Why this model?** {route['routing_reason']}")
+            
+            st.divider()
 
-        # -------------------- ANSWER DISPLAY (NEW) --------------------
+            # -------------------- ANSWER DISPLAY (NEW) --------------------
+
+            st.markdown("### 🧠 Answer")
+
+            answer_box = st.empty()
+            answer = ""
+            last_chunk = ""
+            result = None
+            for event in events:
+                if event["event"] == "token":
+                    last_chunk = event["text"]
+                    answer += last_chunk
+                    answer_box.markdown(ANSWER_HTML.format(answer=answer), unsafe_allow_html=True)
+                elif event["event"] == "done":
+                    result = event
+            
+            if result is None:
+                raise RuntimeError("Response stream ended early")
+            
+            # Final text (includes the empty-response fallback)
+            answer_box.markdown(ANSWER_HTML.format(answer=result["response"]), unsafe_allow_html=True)
 
-        st.markdown("### 🧠 Answer")
+            st.divider()
 
+            # -------------------------------------------------------------
+    
+        if cached is not None:
+            status.success("✅ Answered from this session's cache (no new model call)")
+        else:
+            status.success("✅ Query Processed Successfully!")
+            
+            # Failures come back as the answer text (the handlers yield the
+            # error as their last chunk); only real answers are cached
+            if not (result["response"].startswith(FAILURE_PREFIXES) or last_chunk.startswith(FAILURE_PREFIXES)):
+                response_cache[key] = result
+                if len(response_cache) > RESPONSE_CACHE_SIZE:
+                    response_cache.popitem(last=False)
+            
+            # Update metrics
+            totals = st.session_state.totals
+            totals["carbon_saved"] += result["carbon_saved_g"]
+            totals["water_saved"] += result["water_saved_ml"]
+            totals["emissions_carbon"] += result["emissions_carbon_g"]
+            totals["emissions_water"] += result["emissions_water_ml"]
+            st.session_state._metrics_dirty = True
+        
+            # Add to history
+            st.session_state.query_history.append({
+                "query": user_query,
+                # Truncated once here rather than on every rerun of the history
+                "label": user_query[:50] + ("..." if len(user_query) > 50 else ""),
+                "mode": result["mode"],
+                "model": result["model_used"],
+                "reason": result["routing_reason"],
+                "complexity_score": result["complexity_score"],
+                "carbon_saved": result["carbon_saved_g"],
+                "water_saved": result["water_saved_ml"],
+                "emissions_carbon": result["emissions_carbon_g"],
+                "emissions_water": result["emissions_water_ml"],
+                "latency_ms": result["latency_ms"],
+                # Formatted once; entries never change after they are stored
+                "timestamp_str": datetime.now().strftime("%H:%M:%S")
+            })
+        
+        # Impact metrics
         st.markdown(
-            f"""
-            <div style="
-                background-color: #0f172a;
-                color: #ffffff;
-                padding: 18px;
-                border-radius: 10px;
-                font-size: 1.05rem;
-                line-height: 1.6;
-                border-left: 5px solid #52b788;
-            ">
-                {result['response']}
-            </div>
-            """,
+            IMPACT_HTML.format(
+                ttft_ms=result.get("time_to_first_token_ms", result["latency_ms"]),
+                latency_ms=result["latency_ms"],
+                input_tokens=result["tokens"]["input"],
+                output_tokens=result["tokens"]["output"],
+                emissions_carbon=result["emissions_carbon_g"],
+                emissions_water=result["emissions_water_ml"],
+                carbon_saved=result["carbon_saved_g"],
+                water_saved=result["water_saved_ml"]
+            ),
             unsafe_allow_html=True
         )
-
-        st.divider()
-
-        # -------------------------------------------------------------
-        
-        # Impact metrics
-        impact_col1, impact_col2, impact_col3 = st.columns(3)
-        
-        with impact_col1:
-            st.write("**⏱️ Performance:**")
-            st.write(f"Latency: `{result['latency_ms']:.0f}ms`")
-            st.write(f"Tokens: `{result['tokens']['input']} → {result['tokens']['output']}`")
-        
-        with impact_col2:
-            st.write("**💚 Emissions:**")
-            st.write(f"CO₂: `{result['emissions_carbon_g']:.4f}g`")
-            st.write(f"Water: `{result['emissions_water_ml']:.2f}ml`")
-        
-        with impact_col3:
-            st.write("**✅ Savings:**")
-            st.write(f"CO₂ saved: `{result['carbon_saved_g']:.4f}g`")
-            st.write(f"Water saved: `{result['water_saved_ml']:.2f}ml`")
         
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         st.error("⏱️ Request timeout. TinyLlama might be loading for the first time (takes 30-60 seconds). Try again!")
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         st.error("❌ Backend not running. Start with: `.\\venv\\Scripts\\uvicorn app.main:app --reload`")
     except Exception as e:
         st.error(f"❌ Error: {str(e)}")
@@ -359,93 +587,66 @@ st.divider()
 # Metrics Dashboard
 st.markdown('<h2 class="section-header">📈 Environmental Impact</h2>', unsafe_allow_html=True)
 
-metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
-
-with metric_col1:
-    st.markdown(f"""
-        <div class="metric-container">
-            <div class="metric-label">💚 Carbon Saved</div>
-            <div class="metric-value">{st.session_state.total_carbon_saved:.4f}g</div>
-        </div>
-    """, unsafe_allow_html=True)
-
-with metric_col2:
-    st.markdown(f"""
-        <div class="metric-container">
-            <div class="metric-label">💧 Water Saved</div>
-            <div class="metric-value">{st.session_state.total_water_saved:.2f}ml</div>
-        </div>
-    """, unsafe_allow_html=True)
-
-with metric_col3:
-    st.markdown(f"""
-        <div class="metric-container">
-            <div class="metric-label">⚡ CO₂ Emitted</div>
-            <div class="metric-value">{st.session_state.total_emissions_carbon:.4f}g</div>
-        </div>
-    """, unsafe_allow_html=True)
-
-with metric_col4:
-    st.markdown(f"""
-        <div class="metric-container">
-            <div class="metric-label">🌊 Water Used</div>
-            <div class="metric-value">{st.session_state.total_emissions_water:.2f}ml</div>
-        </div>
-    """, unsafe_allow_html=True)
+st.markdown(metrics_html(), unsafe_allow_html=True)
 
 st.divider()
 
 # Query History
 st.markdown('<h2 class="section-header">📋 Query History & Routing Decisions</h2>', unsafe_allow_html=True)
 
-if st.session_state.query_history:
-    for i, entry in enumerate(st.session_state.query_history[::-1], 1):
-        with st.expander(f"**{i}. {entry['query'][:50]}{'...' if len(entry['query']) > 50 else ''}**"):
-            hist_col1, hist_col2, hist_col3, hist_col4 = st.columns(4)
-            
-            with hist_col1:
-                mode_badge = f'<span class="badge badge-auto" style="background: #d4edda; color: #155724;">Auto</span>' if entry["mode"] == "Automatic" else f'<span class="badge badge-override">Override</span>'
-                st.write("**Mode:**")
-                st.markdown(mode_badge, unsafe_allow_html=True)
-            
-            with hist_col2:
-                model_badge = f'<span class="badge badge-tinyllama">TinyLlama</span>' if entry["model"] == "TinyLlama" else f'<span class="badge badge-mixtral">Mixtral</span>'
-                st.write("**Model:**")
-                st.markdown(model_badge, unsafe_allow_html=True)
-            
-            with hist_col3:
-                st.write("**Complexity:**")
-                st.write(f"{entry['complexity_score']}/25")
-            
-            with hist_col4:
-                st.write("**Time:**")
-                st.write(entry['timestamp'].strftime('%H:%M:%S'))
-            
-            st.divider()
-            
-            st.write(f"**Routing Reason:** {entry['reason']}")
-            
-            col_left, col_right = st.columns(2)
-            with col_left:
-                st.write("**Emissions:**")
-                st.write(f"• CO₂: {entry['emissions_carbon']:.4f}g")
-                st.write(f"• Water: {entry['emissions_water']:.2f}ml")
-                st.write(f"• Latency: {entry['latency_ms']:.0f}ms")
-            
-            with col_right:
-                st.write("**Saved:**")
-                st.write(f"• CO₂: {entry['carbon_saved']:.4f}g ✅")
-                st.write(f"• Water: {entry['water_saved']:.2f}ml ✅")
-else:
-    st.info("📝 No queries yet. Ask a question above!")
+
+@st.fragment
+def history_view() -> None:
+    """History table and details; picking a row reruns only this fragment"""
+    if st.session_state.query_history:
+        # One table for the latest rows instead of an expander per query
+        recent = list(islice(reversed(st.session_state.query_history), HISTORY_ROWS))
+        history_df = pd.DataFrame(
+            {
+                "Time": entry["timestamp_str"],
+                "Query": entry["label"],
+                "Mode": entry["mode"],
+                "Model": entry["model"],
+                "Complexity": entry["complexity_score"],
+                "CO₂ (g)": entry["emissions_carbon"],
+                "Water (ml)": entry["emissions_water"],
+                "Latency (ms)": entry["latency_ms"]
+            }
+            for entry in recent
+        )
+        history_df.index = range(1, len(recent) + 1)
+        st.dataframe(history_df, width="stretch")
+    
+        # Full routing details only for the selected row
+        selected = st.selectbox(
+            "Routing details for",
+            range(len(recent)),
+            format_func=lambda i: f"{i + 1}. {recent[i]['label']}"
+        )
+        entry = recent[selected]
+        with st.expander(f"**{selected + 1}. {entry['label']}**", expanded=True):
+            st.markdown(
+                HISTORY_DETAIL_HTML.format(
+                    row_head=HISTORY_ROW_HEAD[(entry["mode"], entry["model"])],
+                    complexity="—" if entry["complexity_score"] is None else f"{entry['complexity_score']}/25",
+                    time=entry["timestamp_str"],
+                    reason=entry["reason"],
+                    emissions_carbon=entry["emissions_carbon"],
+                    emissions_water=entry["emissions_water"],
+                    latency_ms=entry["latency_ms"],
+                    carbon_saved=entry["carbon_saved"],
+                    water_saved=entry["water_saved"]
+                ),
+                unsafe_allow_html=True
+            )
+    else:
+        st.info("📝 No queries yet. Ask a question above!")
+
+
+history_view()
 
 st.divider()
 
 # Footer
-st.markdown("""
-    <div style="text-align: center; color: #999; padding: 2rem 0; font-size: 0.9rem;">
-        <p><strong>🌱 GreenRoute AI</strong> — Professional Query Routing with User Control</p>
-        <p>Automatic Intelligence + Manual Override = Perfect UX</p>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 